@@ -0,0 +1,64 @@
+"""
+Compares the Flask (WSGI) and the ASGI entry points on the same read routes.
+
+Start both against the same database first, e.g.:
+
+    cd FlaskAPI
+    gunicorn app:app
+    uvicorn asgi:app --port 8001 --workers 4
+
+Then run:
+
+    python asgi_vs_wsgi.py --wsgi https://127.0.0.1:8008/api/v1 --asgi http://127.0.0.1:8001/api/v1 \
+        --username admin --password ... --clients 500 --duration 30
+
+Both servers are given the same paths and the same number of concurrent
+keep-alive clients, one after the other, and the requests per second and
+latency percentiles of each are printed side by side.
+"""
+import sys
+import json
+import asyncio
+import argparse
+from loadgen import Target, login, run_load
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--wsgi', required=True, help="base URL of the Flask app, including the route prefix")
+    parser.add_argument('--asgi', required=True, help="base URL of the ASGI app, including the route prefix")
+    parser.add_argument('--token', help="access token; otherwise one is requested with --username and --password")
+    parser.add_argument('--username')
+    parser.add_argument('--password')
+    parser.add_argument('--paths', default='/events,/rooms,/lecturers,/blocks',
+                        help="comma separated paths requested in turn")
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    token = args.token
+    if token is None:
+        if not args.username or not args.password:
+            parser.error("give --token or --username and --password")
+        # Only the Flask app has /login; the ASGI app accepts the same tokens
+        token = asyncio.run(login(Target(args.wsgi), args.username, args.password))
+    headers = {'Authorization': f'Bearer {token}'}
+    paths = [path.strip() for path in args.paths.split(',') if path.strip()]
+
+    results = {}
+    for name, url in (('wsgi', args.wsgi), ('asgi', args.asgi)):
+        print(f"Running {args.clients} clients against {name} ({url}) for {args.duration}s...", file=sys.stderr)
+        results[name] = asyncio.run(run_load(url, paths, args.clients, args.duration, headers))
+
+    print(f"{'':8}{'req/s':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'errors':>8}  statuses")
+    for name, result in results.items():
+        print(f"{name:8}{result['rps']:>10}{str(result['p50_ms']):>10}{str(result['p90_ms']):>10}"
+              f"{str(result['p99_ms']):>10}{result['errors']:>8}  {result['statuses']}")
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(results, json_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+Drives the routes of FlaskAPI/app.py with concurrent authenticated clients
+and writes their throughput and latency percentiles to a JSON report.
+
+Seed the database with generate.py, start the API, then run e.g.:
+
+    python benchmark.py --url https://127.0.0.1:8008/api/v1 --username bench --password bench \
+        --clients 50 --duration 10 --output report.json
+
+Each scenario runs on its own for --duration seconds: one per read route,
+one per collection for its create, update and delete routes, a batch of
+updates, and /login. Writes only touch the rows the benchmark creates, apart
+from the batch, which rewrites seeded rooms with their current values.
+/register and /stream are left out. Compare two reports with compare.py.
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import subprocess
+from loadgen import Target, login, request, run_sequences
+
+# Bodies of the rows the write scenarios create and update
+BODIES = {
+    'events': {'Subject': "Benchmark", 'SubjectAbbr': "BM", 'StartTime': "10:00", 'EndTime': "11:00",
+               'WeekDay': 2, 'Hide': False},
+    'rooms': {'Name': "Benchmark", 'NameAbbr': "BM", 'Number': "0", 'Capacity': 30, 'Hide': False},
+    'lecturers': {'Name': "Benchmark", 'NameAbbr': "BM", 'Office': "0", 'Hide': False},
+    'blocks': {'Name': "Benchmark", 'NameAbbr': "BM", 'Hide': False},
+}
+
+
+async def get_json(target, path, headers):
+    status, body = await request(target, 'GET', path, headers=headers)
+    if status != 200:
+        raise Exception(f"GET {path} failed with {status}: {body[:200]!r}")
+    return json.loads(body)
+
+
+async def discover(url, headers):
+    """Reads the seeded ids and the data the scenarios are built from."""
+    target = Target(url)
+    ids = {}
+    for collection in ('events', 'rooms', 'lecturers', 'blocks', 'restrictions', 'occupations'):
+        ids[collection] = [row['Id'] for row in (await get_json(target, f"/{collection}?fields=Id", headers))['data']]
+        if not ids[collection]:
+            raise Exception(f"No {collection} found; seed the database with generate.py first")
+    rooms = (await get_json(target, "/rooms?limit=10", headers))['data']
+    version = (await get_json(target, "/schedule?events.limit=1&rooms.limit=1&lecturers.limit=1&blocks.limit=1"
+                                      "&restrictions.limit=1&occupations.limit=1", headers))['version']
+    return ids, rooms, version
+
+
+def random_item(collection, ids):
+    return lambda: f"/{collection}/{random.choice(ids[collection])}"
+
+
+def scenarios(ids, rooms, version, username, password):
+    """Returns {scenario: sequences}, as taken by `loadgen.run_sequences`."""
+    result = {}
+    for collection in ('events', 'rooms', 'lecturers', 'blocks', 'restrictions', 'occupations'):
+        result[f"GET /{collection}"] = [[(f"GET /{collection}", 'GET', f"/{collection}", None)]]
+        result[f"GET /{collection}/<id>"] = [[(f"GET /{collection}/<id>", 'GET', random_item(collection, ids), None)]]
+    result["GET /events?limit=100"] = [[("GET /events?limit=100", 'GET',
+                                         lambda: f"/events?limit=100&after_id={random.choice(ids['events'])}", None)]]
+    result["GET /events?fields="] = [[("GET /events?fields=", 'GET', "/events?fields=Id,Subject,RoomId", None)]]
+    result["GET /rooms/available"] = [[("GET /rooms/available", 'GET',
+                                        lambda: f"/rooms/available?weekday={random.randint(1, 5)}"
+                                                f"&start={random.randint(8, 18):02}:00&end={random.randint(19, 20)}:00",
+                                        None)]]
+    for route in ("/schedule", "/conflicts", "/health", "/stats", "/metrics"):
+        result[f"GET {route}"] = [[(f"GET {route}", 'GET', route, None)]]
+    result["GET /changes"] = [[("GET /changes", 'GET', f"/changes?since={max(0, version - 100)}", None)]]
+
+    restriction_body = dict(LecturerId=ids['lecturers'][0], Type=1, StartTime="10:00", EndTime="11:00", WeekDay=2)
+    occupation_body = dict(RoomId=ids['rooms'][0], StartTime="10:00", EndTime="11:00", WeekDay=2)
+    event_body = dict(BODIES['events'], RoomId=ids['rooms'][0], LecturerId=ids['lecturers'][0])
+    bodies = dict(BODIES, events=event_body, restrictions=restriction_body, occupations=occupation_body)
+    for collection, body in bodies.items():
+        updated = dict(body, **({'Hide': True} if 'Hide' in body else {'WeekDay': 3}))
+        steps = [(f"POST /{collection}", 'POST', f"/{collection}", body),
+                 (f"PUT /{collection}/<id>", 'PUT', f"/{collection}/{{id}}", updated)]
+        if collection == 'blocks':
+            steps.append(("PATCH /blocks/<id>/events", 'PATCH', "/blocks/{id}/events",
+                          {'add': ids['events'][:10], 'remove': []}))
+        steps.append((f"DELETE /{collection}/<id>", 'DELETE', f"/{collection}/{{id}}", None))
+        result[f"{collection} writes"] = [steps]
+
+    batch = [{'op': 'update', 'collection': 'rooms', 'id': room['Id'],
+              'body': {column: room[column] for column in ('Name', 'NameAbbr', 'Number', 'Capacity', 'Hide')}}
+             for room in rooms]
+    result["POST /batch"] = [[("POST /batch", 'POST', "/batch", batch)]]
+    result["POST /login"] = [[("POST /login", 'POST', "/login", {'username': username, 'password': password})]]
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', required=True, help="base URL of the API, including the route prefix")
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10, help="seconds per scenario")
+    parser.add_argument('--only', help="comma separated scenarios to run, e.g. 'GET /events,events writes'")
+    parser.add_argument('--gzip', action='store_true', help="send Accept-Encoding: gzip")
+    parser.add_argument('--output', default='report.json')
+    args = parser.parse_args()
+
+    token = asyncio.run(login(Target(args.url), args.username, args.password))
+    headers = {'Authorization': f'Bearer {token}'}
+    if args.gzip:
+        headers['Accept-Encoding'] = 'gzip'
+    ids, rooms, version = asyncio.run(discover(args.url, headers))
+    selected = scenarios(ids, rooms, version, args.username, args.password)
+    if args.only:
+        names = [name.strip() for name in args.only.split(',')]
+        unknown = [name for name in names if name not in selected]
+        if unknown:
+            parser.error(f"unknown scenarios: {', '.join(unknown)}; choose from {', '.join(selected)}")
+        selected = {name: selected[name] for name in names}
+
+    report = {
+        'commit': git_commit(),
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'url': args.url,
+        'clients': args.clients,
+        'duration': args.duration,
+        'rows': {collection: len(collection_ids) for collection, collection_ids in ids.items()},
+        'routes': {},
+    }
+    print(f"{'route':34}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}  statuses")
+    for name, sequences in selected.items():
+        print(f"Running {name}...", file=sys.stderr)
+        result = asyncio.run(run_sequences(args.url, sequences, args.clients, args.duration, headers))
+        for route, route_result in result['routes'].items():
+            report['routes'][route] = route_result
+            print(f"{route:34}{route_result['rps']:>10}{str(route_result['p50_ms']):>10}"
+                  f"{str(route_result['p95_ms']):>10}{str(route_result['p99_ms']):>10}"
+                  f"{route_result['errors']:>8}  {route_result['statuses']}")
+    with open(args.output, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Compares two reports written by benchmark.py, e.g. of two commits:
+
+    python compare.py base.json new.json --threshold 10
+
+For each route it prints the requests per second and the p50, p95 and p99
+latencies of both runs and their change. It exits with status 1 if any route
+lost more than --threshold percent of its throughput or got that much slower
+at p95 or p99, or if a route started returning errors.
+"""
+import sys
+import json
+import argparse
+
+METRICS = (('rps', -1), ('p50_ms', 1), ('p95_ms', 1), ('p99_ms', 1))
+
+
+def change(base, new):
+    if not base or new is None:
+        return None
+    return (new - base) / base * 100
+
+
+def compare(base, new, threshold):
+    """Returns the table rows and the regressions found."""
+    rows, regressions = [], []
+    for route in sorted(set(base['routes']) | set(new['routes'])):
+        before, after = base['routes'].get(route), new['routes'].get(route)
+        if before is None or after is None:
+            rows.append((route, "only in " + ("new" if before is None else "base")))
+            continue
+        cells = []
+        for metric, worse in METRICS:
+            delta = change(before[metric], after[metric])
+            cells.append(f"{before[metric]} -> {after[metric]}" + (f" ({delta:+.1f}%)" if delta is not None else ""))
+            # Throughput regresses when it drops, latency when it grows
+            if delta is not None and delta * worse > threshold:
+                regressions.append(f"{route}: {metric} {before[metric]} -> {after[metric]} ({delta:+.1f}%)")
+        if after['errors'] > before['errors'] or \
+                sum(count for status, count in after['statuses'].items() if int(status) >= 500) > \
+                sum(count for status, count in before['statuses'].items() if int(status) >= 500):
+            regressions.append(f"{route}: more errors ({after['errors']} errors, statuses {after['statuses']})")
+        rows.append((route, *cells))
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10, help="percent change reported as a regression")
+    args = parser.parse_args()
+
+    with open(args.base) as base_file, open(args.new) as new_file:
+        base, new = json.load(base_file), json.load(new_file)
+    for key in ('clients', 'duration', 'rows'):
+        if base.get(key) != new.get(key):
+            print(f"Warning: the runs differ in {key}: {base.get(key)} vs {new.get(key)}", file=sys.stderr)
+
+    print(f"base {base.get('commit')} ({base.get('started_at')}), new {new.get('commit')} ({new.get('started_at')})")
+    rows, regressions = compare(base, new, args.threshold)
+    print(f"{'route':34}" + "".join(f"{metric:>28}" for metric, _ in METRICS))
+    for route, *cells in rows:
+        print(f"{route:34}" + "".join(f"{cell:>28}" for cell in cells))
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold}%:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Seeds the API's database with a synthetic timetable for the benchmarks.
+
+It connects with the production settings of FlaskAPI/settings.json, so point
+those at a local database created from Database/schedule.sql. For example:
+
+    python generate.py --events 10000 --reset --username bench --password bench
+
+writes 10k events with proportional rooms, lecturers, blocks, restrictions and
+occupations, after emptying those tables when --reset is given. It also creates
+the user the benchmark logs in with. The same --seed always gives the same rows.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'FlaskAPI'))
+
+import bcrypt
+import pymysql
+from config import ProductionConfig as conf
+
+# Rows per 1000 events
+PROPORTIONS = {
+    'ROOM': 50,
+    'LECTURER': 100,
+    'BLOCK': 40,
+    'RESTRICTION': 150,
+    'OCCUPATION': 100,
+}
+EVENTS_PER_BLOCK = 25
+WEEK_DAYS = (1, 2, 3, 4, 5)
+# Classes start on the half hour from 08:00 to 19:00 and last one to three hours
+START_MINUTES = range(8 * 60, 19 * 60 + 1, 30)
+DURATIONS = (60, 90, 120, 180)
+
+# Emptied in this order by --reset, so no foreign key is violated
+TABLES = ('BLOCK_TO_EVENT', 'BLOCK', 'EVENT', 'RESTRICTION', 'OCCUPATION', 'ROOM', 'LECTURER', 'CHANGE_LOG')
+
+
+def clock(minutes):
+    return f"{minutes // 60:02}:{minutes % 60:02}:00"
+
+
+def span(rng):
+    start = rng.choice(START_MINUTES)
+    return clock(start), clock(min(start + rng.choice(DURATIONS), 23 * 60 + 59))
+
+
+def generate(events, seed):
+    """Returns {table: (columns, rows)} for a timetable of `events` events."""
+    rng = random.Random(seed)
+    counts = {table: max(1, events * per_thousand // 1000) for table, per_thousand in PROPORTIONS.items()}
+    rooms = [(f"Room {i}", f"R{i}", str(100 + i), rng.choice((20, 30, 40, 60, 80, 120, 200)), False)
+             for i in range(1, counts['ROOM'] + 1)]
+    lecturers = [(f"Lecturer {i}", f"L{i}", f"Office {i % 300}", False) for i in range(1, counts['LECTURER'] + 1)]
+    blocks = [(f"Block {i}", f"B{i}", False) for i in range(1, counts['BLOCK'] + 1)]
+    event_rows = []
+    for i in range(1, events + 1):
+        start, end = span(rng)
+        event_rows.append((f"Subject {i % 2000}", f"S{i % 2000}", rng.randint(1, counts['LECTURER']),
+                           rng.randint(1, counts['ROOM']), start, end, rng.choice(WEEK_DAYS), False))
+    restrictions = []
+    for _ in range(counts['RESTRICTION']):
+        start, end = span(rng)
+        restrictions.append((rng.randint(1, counts['LECTURER']), rng.randint(1, 3), start, end, rng.choice(WEEK_DAYS)))
+    occupations = []
+    for _ in range(counts['OCCUPATION']):
+        start, end = span(rng)
+        occupations.append((rng.randint(1, counts['ROOM']), start, end, rng.choice(WEEK_DAYS)))
+    block_events = set()
+    for block_id in range(1, counts['BLOCK'] + 1):
+        for event_id in rng.sample(range(1, events + 1), min(EVENTS_PER_BLOCK, events)):
+            block_events.add((block_id, event_id))
+    return {
+        'ROOM': (('Name', 'NameAbbr', 'Number', 'Capacity', 'Hide'), rooms),
+        'LECTURER': (('Name', 'NameAbbr', 'Office', 'Hide'), lecturers),
+        'BLOCK': (('Name', 'NameAbbr', 'Hide'), blocks),
+        'EVENT': (('Subject', 'SubjectAbbr', 'LecturerId', 'RoomId', 'StartTime', 'EndTime', 'WeekDay', 'Hide'),
+                  event_rows),
+        'RESTRICTION': (('LecturerId', 'Type', 'StartTime', 'EndTime', 'WeekDay'), restrictions),
+        'OCCUPATION': (('RoomId', 'StartTime', 'EndTime', 'WeekDay'), occupations),
+        'BLOCK_TO_EVENT': (('BlockId', 'EventId'), sorted(block_events)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=10000, help="number of events, e.g. 1000, 10000 or 100000")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--reset', action='store_true', help="empty the timetable tables first")
+    parser.add_argument('--username', help="user to create for the benchmark")
+    parser.add_argument('--password')
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    args = parser.parse_args()
+
+    connection = pymysql.connect(host=conf.DB_HOST, port=int(conf.DB_PORT), user=conf.DB_USER,
+                                 passwd=conf.DB_PASSWD, db=conf.DB_NAME, connect_timeout=conf.CONNECT_TIMEOUT)
+    tables = generate(args.events, args.seed)
+    with connection.cursor() as cursor:
+        if args.reset:
+            for table in TABLES:
+                cursor.execute(f"DELETE FROM {table}")
+                if table not in ('BLOCK_TO_EVENT', 'CHANGE_LOG'):
+                    # Ids start at 1 again, as generate() expects
+                    cursor.execute(f"ALTER TABLE {table} AUTO_INCREMENT = 1")
+            cursor.execute("UPDATE CHANGE_SEQUENCE SET Seq = 0")
+        else:
+            cursor.execute("SELECT COUNT(*) FROM EVENT")
+            if cursor.fetchone()[0]:
+                raise SystemExit("EVENT is not empty; pass --reset to replace its rows")
+        for table in ('ROOM', 'LECTURER', 'BLOCK', 'EVENT', 'RESTRICTION', 'OCCUPATION', 'BLOCK_TO_EVENT'):
+            columns, rows = tables[table]
+            started = time.monotonic()
+            query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+            for start in range(0, len(rows), args.chunk_size):
+                cursor.executemany(query, rows[start:start + args.chunk_size])
+            print(f"{table}: {len(rows)} rows in {time.monotonic() - started:.1f}s")
+        if args.username:
+            if not args.password:
+                parser.error("--username needs --password")
+            hashed = bcrypt.hashpw((args.password + conf.PEPPER).encode('utf-8'), bcrypt.gensalt(conf.BCRYPT_ROUNDS))
+            cursor.execute("REPLACE INTO USER (Username, PasswordHash, Salt, Hash) VALUES (%s, %s, %s, %s)",
+                           (args.username, hashed, hashed[:29], "bcrypt"))
+    connection.commit()
+    connection.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""
+Minimal HTTP/1.1 load generator built on asyncio, so the benchmarks need no extra packages.
+
+Each simulated client keeps one connection open and sends its requests back
+to back, as a browser tab polling the API would.
+"""
+import ssl
+import gzip
+import time
+import json
+import asyncio
+import urllib.parse
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class Target:
+    def __init__(self, url):
+        parts = urllib.parse.urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.ssl = None
+        if parts.scheme == 'https':
+            # Development certificates are self-signed
+            self.ssl = ssl.create_default_context()
+            self.ssl.check_hostname = False
+            self.ssl.verify_mode = ssl.CERT_NONE
+        self.base_path = parts.path.rstrip('/')
+
+
+async def read_response(reader):
+    """Reads one response and returns (status, body)."""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        body = b''
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            body += await reader.readexactly(size)
+            await reader.readline()
+    else:
+        body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers, body
+
+
+async def request(target, method, path, headers=None, body=None):
+    """Sends a single request on a new connection and returns (status, body)."""
+    reader, writer = await asyncio.open_connection(target.host, target.port, ssl=target.ssl)
+    try:
+        writer.write(encode_request(target, method, path, headers, body, keep_alive=False))
+        await writer.drain()
+        status, _, data = await read_response(reader)
+        return status, data
+    finally:
+        writer.close()
+
+
+def encode_request(target, method, path, headers=None, body=None, keep_alive=True):
+    lines = [f"{method} {target.base_path}{path} HTTP/1.1", f"Host: {target.host}:{target.port}",
+             f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    for name, value in (headers or {}).items():
+        lines.append(f"{name}: {value}")
+    if body is not None:
+        body = json.dumps(body).encode()
+        lines += ["Content-Type: application/json", f"Content-Length: {len(body)}"]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode() + (body or b'')
+
+
+async def login(target, username, password):
+    status, body = await request(target, 'POST', '/login', body={'username': username, 'password': password})
+    if status != 200:
+        raise Exception(f"Login failed with {status}: {body[:200]!r}")
+    return json.loads(body)['access_token']
+
+
+def summarize(latencies, statuses, errors, duration):
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / duration, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        'p90_ms': round(percentile(latencies, 0.90) * 1000, 2) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else None,
+        'errors': errors,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+def created_id(headers, body):
+    """The `Id` of the row a create route returned."""
+    if headers.get('content-encoding') == 'gzip':
+        body = gzip.decompress(body)
+    data = json.loads(body)['data']
+    return data.get('Id', data.get('id'))
+
+
+async def run_sequences(url, sequences, clients, duration, headers=None, warmup=1.0):
+    """Runs `clients` concurrent keep-alive clients for `duration` seconds, each going through `sequences` in turn.
+
+    A sequence is a list of `(name, method, path, body)` steps sent one after
+    the other. `path` may be a function returning the path, and `{id}` in it
+    is replaced by the `Id` returned by the latest create of the sequence; a
+    failed step ends the sequence. Returns the overall results and those of
+    each step name, as `run_load` does. Requests finishing during the first
+    `warmup` seconds are not counted.
+    """
+    target = Target(url)
+    started = time.monotonic()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+    results = {}
+
+    def record(name):
+        return results.setdefault(name, {'latencies': [], 'statuses': {}, 'errors': 0})
+
+    async def client(number):
+        reader = writer = None
+        turn = number
+        while time.monotonic() < deadline:
+            sequence = sequences[turn % len(sequences)]
+            turn += 1
+            row_id = None
+            for name, method, path, body in sequence:
+                if time.monotonic() >= deadline:
+                    break
+                path = path() if callable(path) else path
+                if '{id}' in path:
+                    path = path.replace('{id}', str(row_id))
+                try:
+                    if writer is None:
+                        reader, writer = await asyncio.open_connection(target.host, target.port, ssl=target.ssl)
+                    begin = time.monotonic()
+                    writer.write(encode_request(target, method, path, headers, body))
+                    await writer.drain()
+                    status, response_headers, data = await read_response(reader)
+                    end = time.monotonic()
+                    if response_headers.get('connection', '').lower() == 'close':
+                        writer.close()
+                        writer = None
+                except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+                    if writer is not None:
+                        writer.close()
+                        writer = None
+                    if time.monotonic() >= measure_from:
+                        record(name)['errors'] += 1
+                    await asyncio.sleep(0.05)
+                    break
+                if begin >= measure_from and end <= deadline:
+                    result = record(name)
+                    result['latencies'].append(end - begin)
+                    result['statuses'][status] = result['statuses'].get(status, 0) + 1
+                if status >= 300:
+                    break
+                if method == 'POST':
+                    try:
+                        row_id = created_id(response_headers, data)
+                    except (ValueError, KeyError, TypeError, AttributeError):
+                        row_id = None
+        if writer is not None:
+            writer.close()
+
+    await asyncio.gather(*(client(number) for number in range(clients)))
+    routes = {name: summarize(result['latencies'], result['statuses'], result['errors'], duration)
+              for name, result in results.items()}
+    latencies, statuses, errors = [], {}, 0
+    for result in results.values():
+        latencies += result['latencies']
+        errors += result['errors']
+        for status, count in result['statuses'].items():
+            statuses[status] = statuses.get(status, 0) + count
+    return {'total': summarize(latencies, statuses, errors, duration), 'routes': routes}
+
+
+async def run_load(url, paths, clients, duration, headers=None, warmup=1.0):
+    """Runs `clients` concurrent keep-alive clients cycling through `paths` for `duration` seconds.
+
+    Returns requests per second, latency percentiles (milliseconds) and
+    error counts. Requests finishing during the first `warmup` seconds are
+    not counted.
+    """
+    sequences = [[(path, 'GET', path, None)] for path in paths]
+    result = await run_sequences(url, sequences, clients, duration, headers, warmup)
+    return {'url': url, 'paths': paths, 'clients': clients, 'duration': duration, **result['total']}
@@ -0,0 +1,16 @@
+-- Change log read by /changes and /stream, and the counter numbering its entries
+CREATE TABLE IF NOT EXISTS `CHANGE_LOG` (
+  `Seq` bigint NOT NULL,
+  `Entity` varchar(32) NOT NULL,
+  `EntityId` int NOT NULL,
+  `Operation` varchar(8) NOT NULL,
+  `ChangedAt` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`Seq`)
+);
+
+CREATE TABLE IF NOT EXISTS `CHANGE_SEQUENCE` (
+  `Seq` bigint NOT NULL
+);
+
+INSERT INTO `CHANGE_SEQUENCE` (`Seq`)
+SELECT 0 FROM DUAL WHERE NOT EXISTS (SELECT * FROM `CHANGE_SEQUENCE`);
@@ -0,0 +1,12 @@
+-- Lookups by (room, week day) and (lecturer, week day), as done by the conflict
+-- and availability checks, and the blocks of an event. Each index starts with
+-- the foreign key column, so MySQL drops the implicit foreign key index.
+CREATE INDEX `EVENT_RoomId_WeekDay_StartTime` ON `EVENT` (`RoomId`, `WeekDay`, `StartTime`);
+
+CREATE INDEX `EVENT_LecturerId_WeekDay` ON `EVENT` (`LecturerId`, `WeekDay`);
+
+CREATE INDEX `RESTRICTION_LecturerId_WeekDay` ON `RESTRICTION` (`LecturerId`, `WeekDay`);
+
+CREATE INDEX `OCCUPATION_RoomId_WeekDay_StartTime` ON `OCCUPATION` (`RoomId`, `WeekDay`, `StartTime`);
+
+CREATE INDEX `BLOCK_TO_EVENT_EventId` ON `BLOCK_TO_EVENT` (`EventId`, `BlockId`);
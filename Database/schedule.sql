@@ -68,6 +68,21 @@ CREATE TABLE `OCCUPATION` (
   PRIMARY KEY (`Id`)
 );
 
+CREATE TABLE `CHANGE_LOG` (
+  `Seq` bigint NOT NULL,
+  `Entity` varchar(32) NOT NULL,
+  `EntityId` int NOT NULL,
+  `Operation` varchar(8) NOT NULL,
+  `ChangedAt` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`Seq`)
+);
+
+CREATE TABLE `CHANGE_SEQUENCE` (
+  `Seq` bigint NOT NULL
+);
+
+INSERT INTO `CHANGE_SEQUENCE` (`Seq`) VALUES (0);
+
 ALTER TABLE `EVENT` ADD FOREIGN KEY (`LecturerId`) REFERENCES `LECTURER` (`Id`);
 
 ALTER TABLE `EVENT` ADD FOREIGN KEY (`RoomId`) REFERENCES `ROOM` (`Id`);
@@ -80,6 +95,16 @@ ALTER TABLE `RESTRICTION` ADD FOREIGN KEY (`LecturerId`) REFERENCES `LECTURER` (
 
 ALTER TABLE `OCCUPATION` ADD FOREIGN KEY (`RoomId`) REFERENCES `ROOM` (`Id`);
 
+CREATE INDEX `EVENT_RoomId_WeekDay_StartTime` ON `EVENT` (`RoomId`, `WeekDay`, `StartTime`);
+
+CREATE INDEX `EVENT_LecturerId_WeekDay` ON `EVENT` (`LecturerId`, `WeekDay`);
+
+CREATE INDEX `RESTRICTION_LecturerId_WeekDay` ON `RESTRICTION` (`LecturerId`, `WeekDay`);
+
+CREATE INDEX `OCCUPATION_RoomId_WeekDay_StartTime` ON `OCCUPATION` (`RoomId`, `WeekDay`, `StartTime`);
+
+CREATE INDEX `BLOCK_TO_EVENT_EventId` ON `BLOCK_TO_EVENT` (`EventId`, `BlockId`);
+
 CREATE TABLE `USER` (
   `Username` varchar(255) NOT NULL,
   `Hash` VARCHAR(255) NOT NULL,
@@ -87,3 +112,15 @@ CREATE TABLE `USER` (
   `Salt` varbinary(29) NOT NULL,
   PRIMARY KEY (`Username`)
 );
+
+-- Migrations (see Database/migrations) already included in this script
+CREATE TABLE `SCHEMA_VERSION` (
+  `Version` int NOT NULL,
+  `Name` varchar(255) NOT NULL,
+  `AppliedAt` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`Version`)
+);
+
+INSERT INTO `SCHEMA_VERSION` (`Version`, `Name`) VALUES
+  (1, '0001_change_log.sql'),
+  (2, '0002_secondary_indexes.sql');
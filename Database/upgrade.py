@@ -0,0 +1,153 @@
+"""
+This script upgrades an existing schedule database in place. The SQL files in the migrations folder are applied in the order of their number, and the ones already applied are recorded in the SCHEMA_VERSION table. A database created from schedule.sql starts with every migration recorded.
+
+Usage:
+    python upgrade.py            Applies the pending migrations
+    python upgrade.py status     Lists the migrations and whether they were applied
+    python upgrade.py check      Fails if a hot query is planned as a full scan
+"""
+import os
+import re
+import sys
+from dotenv import load_dotenv
+import mysql.connector
+from mysql.connector import errorcode
+
+# Load environment variables from .env file
+load_dotenv()
+
+migrations_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+db_config = {
+    'user': os.getenv('DB_USER'),
+    'password': os.getenv('DB_PASSWORD'),
+    'host': os.getenv('DB_HOST'),
+    'database': os.getenv('DB_NAME'),
+}
+
+# Errors meaning a statement was already applied, e.g. by a migration that failed halfway
+ALREADY_APPLIED = (
+    errorcode.ER_TABLE_EXISTS_ERROR,
+    errorcode.ER_DUP_KEYNAME,
+    errorcode.ER_DUP_FIELDNAME,
+)
+
+# Queries that must be answered through an index: (description, query, params)
+HOT_QUERIES = [
+    ("events of a room on a week day",
+     "SELECT Id, StartTime FROM EVENT WHERE RoomId = %s AND WeekDay = %s AND StartTime < %s", (1, 2, '16:00')),
+    ("events of a lecturer on a week day",
+     "SELECT Id FROM EVENT WHERE LecturerId = %s AND WeekDay = %s", (1, 2)),
+    ("restrictions of a lecturer on a week day",
+     "SELECT Id FROM RESTRICTION WHERE LecturerId = %s AND WeekDay = %s", (1, 2)),
+    ("occupations of a room on a week day",
+     "SELECT Id, StartTime FROM OCCUPATION WHERE RoomId = %s AND WeekDay = %s AND StartTime < %s", (1, 2, '16:00')),
+    ("blocks of an event",
+     "SELECT BlockId FROM BLOCK_TO_EVENT WHERE EventId = %s", (1,)),
+    ("events of a block",
+     "SELECT EventId FROM BLOCK_TO_EVENT WHERE BlockId = %s", (1,)),
+    ("changes since a sequence number",
+     "SELECT Seq, Entity, EntityId, Operation FROM CHANGE_LOG WHERE Seq > %s ORDER BY Seq", (0,)),
+]
+
+
+def list_migrations():
+    """Returns [(version, file name)] sorted by version."""
+    migrations = []
+    for file_name in os.listdir(migrations_folder):
+        match = re.match(r"(\d+)_\w+\.sql$", file_name)
+        if match:
+            migrations.append((int(match.group(1)), file_name))
+    migrations.sort()
+    versions = [version for version, _ in migrations]
+    if len(set(versions)) != len(versions):
+        raise Exception("Two migrations share the same number")
+    return migrations
+
+
+def split_statements(sql):
+    """Splits a migration into statements, dropping comments."""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith('--')]
+    return [statement.strip() for statement in "\n".join(lines).split(';') if statement.strip()]
+
+
+def applied_versions(cursor):
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS SCHEMA_VERSION (
+      Version int NOT NULL,
+      Name varchar(255) NOT NULL,
+      AppliedAt timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+      PRIMARY KEY (Version)
+    )
+    """)
+    cursor.execute("SELECT Version FROM SCHEMA_VERSION")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def upgrade(connection):
+    """Applies every migration not yet recorded in SCHEMA_VERSION."""
+    cursor = connection.cursor()
+    applied = applied_versions(cursor)
+    pending = [(version, file_name) for version, file_name in list_migrations() if version not in applied]
+    if not pending:
+        print("The schema is up to date")
+    for version, file_name in pending:
+        with open(os.path.join(migrations_folder, file_name)) as sql_file:
+            statements = split_statements(sql_file.read())
+        print(f"Applying {file_name}")
+        # MySQL commits DDL statements right away, so a migration cannot be rolled back as a whole
+        for statement in statements:
+            try:
+                cursor.execute(statement)
+            except mysql.connector.Error as e:
+                if e.errno not in ALREADY_APPLIED:
+                    raise
+                print(f"  already applied: {e.msg}")
+        cursor.execute("INSERT INTO SCHEMA_VERSION (Version, Name) VALUES (%s, %s)", (version, file_name))
+        connection.commit()
+    cursor.close()
+
+
+def status(connection):
+    cursor = connection.cursor()
+    applied = applied_versions(cursor)
+    for version, file_name in list_migrations():
+        print(f"{'applied' if version in applied else 'pending'}  {file_name}")
+    cursor.close()
+
+
+def check(connection):
+    """Runs EXPLAIN on every hot query and returns the ones planned as a full scan."""
+    cursor = connection.cursor(dictionary=True)
+    failures = []
+    for description, query, params in HOT_QUERIES:
+        cursor.execute("EXPLAIN " + query, params)
+        plan = cursor.fetchall()
+        # ALL reads the whole table and index reads the whole of an index
+        scans = [row for row in plan if row['type'] in ('ALL', 'index')]
+        keys = ', '.join(str(row['key']) for row in plan)
+        print(f"{'FULL SCAN' if scans else 'ok':9}  {description} (key: {keys})")
+        if scans:
+            failures.append(description)
+    cursor.close()
+    return failures
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'upgrade'
+    if command not in ('upgrade', 'status', 'check'):
+        print(__doc__)
+        sys.exit(2)
+
+    connection = mysql.connector.connect(**db_config)
+    exit_code = 0
+    try:
+        if command == 'upgrade':
+            upgrade(connection)
+        elif command == 'status':
+            status(connection)
+        elif check(connection):
+            exit_code = 1
+    finally:
+        connection.close()
+    sys.exit(exit_code)
@@ -1,14 +1,27 @@
 import os
+import time
+import random
 import pymysql
-import bcrypt
 from http import HTTPStatus
 from flask_cors import CORS
-from flask import Flask, redirect, request, jsonify, url_for, abort
-from db import Database
+from flask import Flask, Response, redirect, request, jsonify, url_for, abort, g, stream_with_context
+from db import Database, get_pool
+import versions
+from versions import table_versions
+from cache import ReadThroughCache
+from conflicts import find_conflicts, ClashIndex
+from availability import RoomAvailability
+from batch import compile_batch, group_operations, insert_rows
+from compression import choose_encoding, compress
+from passwords import PasswordHasher, HasherBusyError
+import metrics
+from profiling import RequestProfiler
+import schema
 from config import ProductionConfig as conf
-from json_provider import UpdatedJSONProvider
-from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required, JWTManager
+from json_provider import get_json_provider
+from flask_jwt_extended import create_access_token, get_jwt_identity, jwt_required, verify_jwt_in_request, JWTManager
 import datetime
+import functools
 import pymysql.cursors
 
 
@@ -28,12 +41,13 @@ def create_app():
     return app
 
 
-def get_response_msg(data, status_code):
+def get_response_msg(data, status_code, **extra):
     message = {
         'status': status_code,
         # 'data': data if data else 'No records found'
         'data': data if data else []
     }
+    message.update(extra)
 
     response_msg = jsonify(message)
 
@@ -41,11 +55,565 @@ def get_response_msg(data, status_code):
     return response_msg
 
 
+def get_busy_msg(busy):
+    """Turns away a login or registration while the password hasher is saturated."""
+    response = jsonify({"message": str(busy)})
+    response.status_code = HTTPStatus.SERVICE_UNAVAILABLE
+    response.headers['Retry-After'] = str(busy.retry_after)
+    return response
+
+
+def stream_requested():
+    """Whether the client opted into a streamed list response with `?stream=true`."""
+    return request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
+def get_stream_msg(rows, status_code):
+    """Streams `rows` in the same envelope as `get_response_msg`."""
+    response_msg = Response(
+        stream_with_context(app.json.stream_envelope(rows, status_code)),
+        mimetype=app.json.mimetype)
+    response_msg.status_code = status_code
+    return response_msg
+
+
+def get_page_args(args=None):
+    """Parses the `?limit=&after_id=` keyset pagination arguments."""
+    args = request.args if args is None else args
+    limit = args.get('limit')
+    after_id = args.get('after_id')
+    if limit is not None:
+        limit = int(limit)
+        if not 0 < limit <= conf.MAX_PAGE_SIZE:
+            raise ValueError(f"limit must be between 1 and {conf.MAX_PAGE_SIZE}")
+    if after_id is not None:
+        after_id = int(after_id)
+    return limit, after_id
+
+
+def build_list_query(table, args=None, ids=None):
+    """Builds the SELECT of a collection route from its `?fields=`, `?limit=` and `?after_id=` arguments.
+
+    `ids`, when given, further restricts the rows to those ids.
+    """
+    args = request.args if args is None else args
+    limit, after_id = get_page_args(args)
+    fields = args.get('fields')
+    if fields:
+        fields = schema.parse_fields(table, fields)
+        if (limit is not None or ids is not None) and 'Id' not in fields:
+            # The cursor is taken from the last row
+            fields.insert(0, 'Id')
+        query = f"SELECT {', '.join(f'`{field}`' for field in fields)} FROM {table}"
+    else:
+        query = f"SELECT * FROM {table}"
+    conditions, params = [], []
+    if after_id is not None:
+        conditions.append("Id > %s")
+        params.append(after_id)
+    if ids is not None:
+        conditions.append(f"Id IN ({', '.join(['%s'] * len(ids))})")
+        params.extend(ids)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    if limit is not None:
+        query += " ORDER BY Id LIMIT %s"
+        params.append(limit)
+    return query, tuple(params), limit
+
+
+def build_blocks_query(args=None, ids=None):
+    """Same as `build_list_query` for BLOCK, with the block's AssociatedEventIds."""
+    args = request.args if args is None else args
+    limit, after_id = get_page_args(args)
+    fields = schema.parse_fields('BLOCK', args.get('fields'), extra=('AssociatedEventIds',))
+    if (limit is not None or ids is not None) and 'Id' not in fields:
+        fields.insert(0, 'Id')
+    columns = [f"b.`{field}` AS `{field}`" for field in fields if field != 'AssociatedEventIds']
+    with_events = 'AssociatedEventIds' in fields
+    if with_events:
+        columns.append("GROUP_CONCAT(be.EventId) AS AssociatedEventIds")
+    query = f"""
+    SELECT
+        {', '.join(columns)}
+    FROM 
+        BLOCK b
+    """
+    if with_events:
+        query += """
+    LEFT JOIN 
+        BLOCK_TO_EVENT be ON b.Id = be.BlockId
+    """
+    conditions, params = [], []
+    if after_id is not None:
+        conditions.append("b.Id > %s")
+        params.append(after_id)
+    if ids is not None:
+        conditions.append(f"b.Id IN ({', '.join(['%s'] * len(ids))})")
+        params.extend(ids)
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    if with_events:
+        query += " GROUP BY b.Id"
+    if limit is not None:
+        query += " ORDER BY b.Id LIMIT %s"
+        params.append(limit)
+    return query, tuple(params), limit
+
+
+def get_list_msg(records, status_code, limit):
+    """Like `get_response_msg`, adding the `next_after_id` cursor to paginated responses."""
+    if limit is None:
+        return get_response_msg(records, status_code)
+    next_after_id = records[-1]['Id'] if len(records) == limit else None
+    return get_response_msg(records, status_code, next_after_id=next_after_id)
+
+
+def table_changed(*tables, row_id=None, row=None, seq=None):
+    """Called by the write routes once their changes are committed.
+
+    `row_id` and `row` (None once deleted) describe the written row, as
+    read back inside the write's transaction, and `seq` is the sequence
+    number it was logged under, so the in-memory indexes can be updated in
+    place instead of being reloaded.
+    Returns the new versions of the tables.
+    """
+    versions = table_versions.bump(*tables, seq=seq)
+    reference_cache.invalidate(*tables)
+    body_cache.invalidate(*tables)
+    if seq is not None:
+        for index in (clash_index, room_availability):
+            index.apply(tables[0], None if row_id is None else int(row_id), row, seq)
+        if conf.CHANGE_LOG_RETENTION and seq > conf.CHANGE_LOG_RETENTION and seq % CHANGE_LOG_PRUNE_EVERY == 0:
+            try:
+                prune_change_log(get_db(), seq)
+            except Exception:
+                # The write is committed; the next round prunes what this one left
+                pass
+    return versions
+
+
+def read_index_changes(db, since, until, tables):
+    """Returns the (table, id, row) writes to `tables` logged after `since` up to `until`.
+
+    Only the last write of each row is kept, with the row as it stands now,
+    or None if it was deleted. Must run inside a consistent snapshot.
+    """
+    collections = {collection: table for collection, table in schema.COLLECTIONS.items() if table in tables}
+    query = (f"SELECT Entity, EntityId, Operation FROM CHANGE_LOG WHERE Seq > %s AND Seq <= %s "
+             f"AND Entity IN ({', '.join(['%s'] * len(collections))}) ORDER BY Seq")
+    latest = {}
+    for change in db.run_query(query=query, args=(since, until, *collections)):
+        latest[(change['Entity'], change['EntityId'])] = change['Operation']
+    ids = {}
+    for (collection, entity_id), operation in latest.items():
+        if operation != 'delete':
+            ids.setdefault(collection, set()).add(entity_id)
+    rows = {(collection, row['Id']): row
+            for collection, collection_ids in ids.items()
+            for row in fetch_rows(db, collection, collection_ids)}
+    return [(collections[collection], entity_id, rows.get((collection, entity_id)))
+            for collection, entity_id in latest]
+
+
+def sync_index(index, db, load):
+    """Returns an in-memory index once it reflects every write logged by any process.
+
+    The first call loads it whole with `load(db)`. After that, when another
+    process logged writes the index has not seen, only those are read back
+    from CHANGE_LOG and applied, unless some were already pruned.
+    """
+    with index.lock:
+        if index.seq is not None and index.seq >= table_versions.seq:
+            return index
+        with db.transaction(read_only=True, consistent_snapshot=True):
+            seq = db.run_query(query="SELECT Seq FROM CHANGE_SEQUENCE")[0]['Seq']
+            if index.seq is None or changes_pruned(db, index.seq):
+                index.load(load(db), seq)
+            else:
+                index.catch_up(read_index_changes(db, index.seq, seq, index.TABLES), seq)
+    return index
+
+
+def get_clash_index(db):
+    """Returns the clash index, up to date with the writes of every process."""
+    return sync_index(clash_index, db, lambda db: {
+        'EVENT': db.run_query(query="SELECT Id, RoomId, LecturerId, WeekDay, StartTime, EndTime FROM EVENT"),
+        'RESTRICTION': db.run_query(query="SELECT * FROM RESTRICTION"),
+        'OCCUPATION': db.run_query(query="SELECT * FROM OCCUPATION"),
+    })
+
+
+def get_room_availability(db):
+    """Returns the room occupancy slots, up to date with the writes of every process."""
+    return sync_index(room_availability, db, lambda db: {
+        'ROOM': db.run_query(query="SELECT * FROM ROOM"),
+        'EVENT': db.run_query(query="SELECT Id, RoomId, WeekDay, StartTime, EndTime FROM EVENT"),
+        'OCCUPATION': db.run_query(query="SELECT * FROM OCCUPATION"),
+    })
+
+
+def describe_batch_error(group, error):
+    """Names the batch operations that were running when `error` was raised."""
+    if not group:
+        return str(error)
+    first, last = group[0].position, group[-1].position
+    return f"Operation {first}: {error}" if first == last else f"Operations {first}-{last}: {error}"
+
+
+def conflict_check_mode():
+    """How event writes are checked for clashes: `off`, `report` or `reject` (`?conflicts=`)."""
+    mode = request.args.get('conflicts', conf.CONFLICT_CHECK)
+    if mode not in ('off', 'report', 'reject'):
+        raise ValueError("conflicts must be one of off, report or reject")
+    return mode
+
+
+def record_change(db, collection, entity_id, operation):
+    """Appends a write to CHANGE_LOG and returns its sequence number.
+
+    Must run inside the write's transaction. Taking the next number locks the
+    CHANGE_SEQUENCE row until commit, so writers commit in sequence order and
+    a client that has seen number N never misses a change numbered below N.
+    """
+    return record_changes(db, [(collection, entity_id, operation)])
+
+
+def record_changes(db, changes):
+    """Appends several (collection, id, operation) writes to CHANGE_LOG, in order.
+
+    Reserves their sequence numbers in one go and returns the last one. Same
+    rules as `record_change`.
+    """
+    with db.get_connection().cursor() as cursor:
+        cursor.execute("UPDATE CHANGE_SEQUENCE SET Seq = LAST_INSERT_ID(Seq + %s)", (len(changes),))
+        last = cursor.lastrowid
+        first = last - len(changes) + 1
+        cursor.executemany("INSERT INTO CHANGE_LOG (Seq, Entity, EntityId, Operation) VALUES (%s, %s, %s, %s)",
+                           [(first + n,) + tuple(change) for n, change in enumerate(changes)])
+    return last
+
+
+# CHANGE_LOG is pruned by the write taking every CHANGE_LOG_PRUNE_EVERY-th sequence number
+CHANGE_LOG_PRUNE_EVERY = 1000
+
+
+def prune_change_log(db, seq):
+    """Deletes the CHANGE_LOG entries older than the last CHANGE_LOG_RETENTION up to `seq`.
+
+    Runs after the write's commit. At most ten rounds of entries go at once,
+    so a first prune of a long log is spread over several writes.
+    """
+    db.run_query(query="DELETE FROM CHANGE_LOG WHERE Seq <= %s ORDER BY Seq LIMIT %s",
+                 args=(seq - conf.CHANGE_LOG_RETENTION, CHANGE_LOG_PRUNE_EVERY * 10))
+
+
+def changes_pruned(db, since):
+    """Whether changes logged after `since` may have been pruned from CHANGE_LOG.
+
+    Must run inside the same consistent snapshot as the read of the changes.
+    """
+    first = db.run_query(query="SELECT MIN(Seq) AS Seq FROM CHANGE_LOG")[0]['Seq']
+    if first is None:
+        # Nothing was logged yet, or everything was pruned
+        first = db.run_query(query="SELECT Seq FROM CHANGE_SEQUENCE")[0]['Seq'] + 1
+    return since < first - 1
+
+
+def read_written_row(db, table, row_id):
+    """Returns a row as the current transaction left it, or None if there is no such row.
+
+    The row is locked, so it is read as committed rather than from the
+    transaction's snapshot.
+    """
+    records = db.run_query(query=f"SELECT * FROM {table} WHERE Id = %s FOR UPDATE", args=(row_id,))
+    return records[0] if records else None
+
+
+def get_block_events(cursor, block_id):
+    """Returns the ids of the events associated with a block, locking those rows."""
+    cursor.execute("SELECT EventId FROM BLOCK_TO_EVENT WHERE BlockId = %s FOR UPDATE", (block_id,))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def change_block_events(cursor, block_id, add=(), remove=()):
+    """Associates the `add` events with a block and dissociates the `remove` ones.
+
+    Only the given rows are touched, with at most two statements.
+    """
+    if remove:
+        remove = list(remove)
+        cursor.execute(f"DELETE FROM BLOCK_TO_EVENT WHERE BlockId = %s AND EventId IN ({', '.join(['%s'] * len(remove))})",
+                       (block_id, *remove))
+    if add:
+        cursor.executemany("INSERT INTO BLOCK_TO_EVENT (BlockId, EventId) VALUES (%s, %s)",
+                           [(block_id, event_id) for event_id in add])
+
+
+def set_block_events(cursor, block_id, event_ids, current=None):
+    """Makes `event_ids` the events of a block, writing only what differs from the stored membership.
+
+    `current` is the stored membership when already known (e.g. empty for a
+    new block).
+    """
+    event_ids = list(dict.fromkeys(int(event_id) for event_id in event_ids))
+    if current is None:
+        current = get_block_events(cursor, block_id)
+    wanted = set(event_ids)
+    change_block_events(cursor, block_id,
+                        add=[event_id for event_id in event_ids if event_id not in current],
+                        remove=sorted(current - wanted))
+
+
+def fetch_rows(db, collection, ids, args={}):
+    """Returns the current rows of a collection with the given ids."""
+    ids = list(ids)
+    records = []
+    for start in range(0, len(ids), 1000):
+        chunk = ids[start:start + 1000]
+        if schema.COLLECTIONS[collection] == 'BLOCK':
+            query, params, _ = build_blocks_query(args, ids=chunk)
+            records += split_associated_event_ids(db.run_query(query=query, args=params))
+        else:
+            query, params, _ = build_list_query(schema.COLLECTIONS[collection], args, ids=chunk)
+            records += db.run_query(query=query, args=params)
+    return records
+
+
+def read_changes(db, since, args={}):
+    """Collects the changes logged after sequence number `since`.
+
+    Returns the last sequence number read and, per collection, the current
+    rows of the inserted or updated ids and the deleted ids. `args` holds
+    the prefixed per-collection arguments, as for /schedule.
+    """
+    query = "SELECT Seq, Entity, EntityId, Operation FROM CHANGE_LOG WHERE Seq > %s ORDER BY Seq"
+    logged = db.run_query(query=query, args=(since,))
+    if not logged:
+        return since, {}
+
+    # Only the last operation on each row matters
+    latest = {}
+    for change in logged:
+        latest[(change['Entity'], change['EntityId'])] = change['Operation']
+
+    changes = {}
+    for (collection, entity_id), operation in latest.items():
+        entry = changes.setdefault(collection, {'upserted': [], 'deleted': []})
+        entry['deleted' if operation == 'delete' else 'upserted'].append(entity_id)
+    for collection, entry in changes.items():
+        if entry['upserted']:
+            collection_args = {key[len(collection) + 1:]: value for key, value in args.items()
+                               if key.startswith(collection + '.')}
+            entry['upserted'] = fetch_rows(db, collection, entry['upserted'], collection_args)
+    return logged[-1]['Seq'], changes
+
+
+def cached_query(tables, key, loader):
+    """Serves `loader()` through the reference cache.
+
+    Entries are stamped with the versions of `tables`, so a write made by any
+    worker process makes them stale.
+    """
+    stamp = tuple(table_versions.get(table) for table in tables)
+    return reference_cache.get_or_load(key, loader, stamp)
+
+
+def split_associated_event_ids(records):
+    """Turns the GROUP_CONCAT'ed AssociatedEventIds of block records into lists."""
+    for record in records:
+        if 'AssociatedEventIds' not in record:
+            continue
+        try:
+            record['AssociatedEventIds'] = [
+                int(event_id) for event_id in record['AssociatedEventIds'].split(',')]
+        except:
+            # case where record['AssociatedEventIds'] = null
+            record['AssociatedEventIds'] = []
+    return records
+
+
+class UncachedResponse(Exception):
+    """Carries a response that must not be cached out of a cache loader."""
+
+    def __init__(self, response):
+        super().__init__(response.status)
+        self.response = response
+
+
+def encode_view(view, args, kwargs, encoding):
+    """Runs `view` and returns its (body, content type, compressed) for `body_cache`.
+
+    Bodies under `COMPRESS_MIN_SIZE` bytes are kept as they are.
+    """
+    response = app.make_response(view(*args, **kwargs))
+    if response.status_code != HTTPStatus.OK or response.is_streamed:
+        raise UncachedResponse(response)
+    body = response.get_data()
+    if len(body) < conf.COMPRESS_MIN_SIZE:
+        return body, response.content_type, False
+    return compress(body, encoding), response.content_type, True
+
+
+def conditional(*tables):
+    """Tags GET responses with an ETag derived from the versions of `tables`.
+
+    A request whose `If-None-Match` still matches is answered with
+    `304 Not Modified` without running the view, so without touching MySQL.
+    For clients accepting br or gzip, the encoded body is cached under the
+    tag, so repeating the request neither queries nor compresses again.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(*args, **kwargs)
+            # Taken before the query runs, so a concurrent write can only make the tag stale, never too new
+            etag = table_versions.etag(tables, request.path.encode() + b'?' + request.query_string)
+            if request.if_none_match.contains_weak(etag):
+                response = app.response_class(status=HTTPStatus.NOT_MODIFIED)
+            else:
+                encoding = choose_encoding(request.accept_encodings)
+                if encoding is None or stream_requested():
+                    response = app.make_response(view(*args, **kwargs))
+                    if response.status_code != HTTPStatus.OK:
+                        return response
+                else:
+                    # Stored under the tag, so a body is only reused while the tables are unchanged
+                    key = (tables[0], 'body', request.path, request.query_string, encoding)
+                    try:
+                        body, content_type, compressed = body_cache.get_or_load(
+                            key, lambda: encode_view(view, args, kwargs, encoding), stamp=etag)
+                    except UncachedResponse as uncached:
+                        return uncached.response
+                    response = app.response_class(body, content_type=content_type)
+                    if compressed:
+                        response.content_encoding = encoding
+            response.vary.add('Accept-Encoding')
+            response.set_etag(etag, weak=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def get_db():
+    """Returns the request's pooled database connection, checking it out on first use."""
+    if 'db' not in g:
+        g.db = Database(conf)
+    return g.db
+
+
+def warm_up():
+    """Opens the pooled connections and loads the caches and indexes the read routes use.
+
+    The gunicorn workers call it before accepting requests (see
+    gunicorn.conf.py), so their first requests are not the ones paying for it.
+    """
+    get_pool(conf).prefill()
+    db = Database(conf)
+    try:
+        for table in ('ROOM', 'LECTURER'):
+            query, params, _ = build_list_query(table, {})
+            cached_query((table,), (table, 'list', b''), lambda: db.run_query(query=query, args=params))
+        query, params, _ = build_blocks_query({})
+        cached_query(('BLOCK', 'BLOCK_TO_EVENT'), ('BLOCK', 'list', b''),
+                     lambda: split_associated_event_ids(db.run_query(query=query, args=params)))
+        get_clash_index(db)
+        get_room_availability(db)
+    finally:
+        db.close_connection()
+
+
 app = create_app()
 jwt = JWTManager(app)
+reference_cache = ReadThroughCache(maxsize=conf.CACHE_SIZE, ttl=conf.CACHE_TTL)
+body_cache = ReadThroughCache(maxsize=conf.COMPRESS_CACHE_SIZE, ttl=conf.CACHE_TTL)
+clash_index = ClashIndex()
+room_availability = RoomAvailability(slot_minutes=conf.AVAILABILITY_SLOT_MINUTES)
+password_hasher = PasswordHasher(workers=conf.BCRYPT_WORKERS, queue_size=conf.BCRYPT_QUEUE_SIZE,
+                                 rounds=conf.BCRYPT_ROUNDS)
+metrics.configure(slow_query_seconds=conf.SLOW_QUERY_SECONDS, slow_query_path=conf.SLOW_QUERY_LOG)
+profiler = RequestProfiler(os.path.join(conf.BASE_DIR, conf.PROFILE_DIR), interval=conf.PROFILE_INTERVAL,
+                           max_files=conf.PROFILE_MAX_FILES, max_bytes=conf.PROFILE_MAX_MB * 1024 * 1024)
+
+
+def profile_requested():
+    """Whether one of PROFILE_USERS asked for this request to be profiled by sending `X-Profile`."""
+    if 'X-Profile' not in request.headers or not conf.PROFILE_USERS:
+        return False
+    try:
+        verify_jwt_in_request(optional=True)
+    except Exception:
+        # The view reports bad tokens
+        return False
+    return get_jwt_identity() in conf.PROFILE_USERS
+
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+    # Sampled requests are only written to PROFILE_DIR, the response headers are for PROFILE_USERS
+    g.profile_shown = profile_requested()
+    if g.profile_shown or (conf.PROFILE_SAMPLE_RATE and random.random() < conf.PROFILE_SAMPLE_RATE):
+        g.profile = profiler.start(f"{request.method} {request.path}")
+
+
+# Registered first, so it runs last and the profile covers the other after_request functions
+@app.after_request
+def finish_profile(response):
+    profile = g.pop('profile', None)
+    if profile is not None:
+        name = profiler.stop(profile)
+        if g.get('profile_shown'):
+            response.headers['Server-Timing'] = ', '.join(
+                f"{metric};dur={seconds * 1000:.1f}" for metric, seconds in profile.timings().items())
+            if name is not None:
+                response.headers['X-Profile'] = name
+    return response
+
+
+@app.teardown_request
+def discard_profile(exception):
+    # Only left when the response could not be built
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiler.stop(profile, save=False)
+
+
+# Registered before compress_response, so it runs after it and sees the bytes sent
+@app.after_request
+def observe_request(response):
+    size = None if response.is_streamed else response.content_length
+    metrics.observe_request(request.method, response.status_code, time.perf_counter() - g.started, size)
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    """Compresses large responses that `conditional` did not already handle."""
+    if (response.status_code != HTTPStatus.OK or response.is_streamed or response.direct_passthrough
+            or response.content_encoding or request.method == 'HEAD'):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request.accept_encodings)
+    body = response.get_data()
+    if encoding is None or len(body) < conf.COMPRESS_MIN_SIZE:
+        return response
+    response.set_data(compress(body, encoding))
+    response.content_encoding = encoding
+    return response
+
+
+@app.teardown_appcontext
+def release_db(exception):
+    # Give the request's connection back to the pool
+    db = g.pop('db', None)
+    if db is not None:
+        db.close_connection()
+
 
 # assign to an app instance
-app.json = UpdatedJSONProvider(app)
+app.json = get_json_provider(conf.JSON_PROVIDER)(app)
 wsgi_app = app.wsgi_app
 
 
@@ -58,15 +626,17 @@ def register():
     username = request.json.get("username", None)
     password = request.json.get("password", None)
 
-    # Generate a salt and hash the password
-    salt = bcrypt.gensalt()  # Generates a new salt
-    hashed_password = bcrypt.hashpw(
-        (password + conf.PEPPER).encode('utf-8'), salt)
+    # Hash the password with a new salt, off the request thread, before
+    # checking out a connection so that none is held while waiting for the hasher
+    try:
+        hashed_password = password_hasher.hash((password + conf.PEPPER).encode('utf-8'))
+    except HasherBusyError as busy:
+        return get_busy_msg(busy)
+    salt = hashed_password[:29]  # "$2b$<rounds>$" followed by the salt
     query = f"INSERT INTO USER(Username, PasswordHash, Salt, Hash) VALUES (%s, %s, %s, %s)"
     params = [username, hashed_password, salt, "bcrypt"]
-    db = Database(conf)
+    db = get_db()
     records = db.run_query(query=query, args=tuple(params))
-    db.close_connection()
     response = get_response_msg(records, HTTPStatus.OK)
     return response
 
@@ -79,24 +649,28 @@ def login():
     username = request.json.get("username", None)
     password = request.json.get("password", None)
 
-    db = Database(conf)
+    db = get_db()
     query = "SELECT PasswordHash, Salt FROM USER WHERE Username = %s"
     records = db.run_query(query=query, args=(username,))
-    db.close_connection()
 
     if len(records) == 0:
         response = jsonify({"message": "User not found"}
                            ), HTTPStatus.UNAUTHORIZED
         return response
 
-    stored_hashed_password = records[0]["PasswordHash"]
-    salt = records[0]["Salt"]
+    stored_hashed_password = bytes(records[0]["PasswordHash"])
+
+    # Give the connection back to the pool before waiting for the hasher
+    g.pop('db').close_connection()
 
     # Don't forget to add the pepper
     entered_password = (password + conf.PEPPER).encode('utf-8')
-    hashed_password_to_check = bcrypt.hashpw(entered_password, salt)
+    try:
+        password_matches = password_hasher.check(entered_password, stored_hashed_password)
+    except HasherBusyError as busy:
+        return get_busy_msg(busy)
 
-    if hashed_password_to_check == stored_hashed_password:
+    if password_matches:
         access_token = create_access_token(identity=username)
         response = jsonify(access_token=access_token), HTTPStatus.OK
 
@@ -113,9 +687,10 @@ def login():
 
 @app.route(f"{route_prefix}/events/<id>", methods=['GET'])
 @jwt_required()
+@conditional('EVENT')
 def getEvent(id):
     try:
-        db = Database(conf)
+        db = get_db()
         params = []
         query = "SELECT * FROM EVENT WHERE Id = %s"
         params.append(id)
@@ -124,7 +699,6 @@ def getEvent(id):
             abort(HTTPStatus.NOT_FOUND,
                   description=f"Event with ID {id} not found")
         response = get_response_msg(records[0], HTTPStatus.OK)
-        db.close_connection()
         return response
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -134,9 +708,10 @@ def getEvent(id):
 # Route for getting a specific block by ID
 @app.route(f"{route_prefix}/blocks/<id>", methods=['GET'])
 @jwt_required()
+@conditional('BLOCK', 'BLOCK_TO_EVENT')
 def getBlock(id):
     try:
-        db = Database(conf)
+        db = get_db()
         query = f"""
         SELECT
             b.Id AS Id, 
@@ -153,17 +728,10 @@ def getBlock(id):
         GROUP BY 
             b.Id, b.Name;
         """
-        records = db.run_query(query=query, args=(id))
-        for record in records:
-            try:
-                record['AssociatedEventIds'] = [
-                    int(event_id) for event_id in record['AssociatedEventIds'].split(',')]
-            except:
-                # case where record['AssociatedEventIds'] = null
-                record['AssociatedEventIds'] = []
+        records = cached_query(('BLOCK', 'BLOCK_TO_EVENT'), ('BLOCK', 'item', str(id)),
+                               lambda: split_associated_event_ids(db.run_query(query=query, args=(id))))
         response = get_response_msg(records[0], HTTPStatus.OK)
 
-        db.close_connection()
         return response
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -173,13 +741,14 @@ def getBlock(id):
 # /api/v1/rooms/{Id}
 @app.route(f"{route_prefix}/rooms/<id>", methods=['GET'])
 @jwt_required()
+@conditional('ROOM')
 def getRoom(id):
     try:
-        db = Database(conf)
+        db = get_db()
         query = f"SELECT * FROM ROOM WHERE Id = %s"
-        records = db.run_query(query=query, args=(id))
+        records = cached_query(('ROOM',), ('ROOM', 'item', str(id)),
+                               lambda: db.run_query(query=query, args=(id)))
         response = get_response_msg(records[0], HTTPStatus.OK)
-        db.close_connection()
         return response
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -189,13 +758,14 @@ def getRoom(id):
 # /api/v1/lecturers/{Id}
 @app.route(f"{route_prefix}/lecturers/<id>", methods=['GET'])
 @jwt_required()
+@conditional('LECTURER')
 def getLecturer(id):
     try:
-        db = Database(conf)
+        db = get_db()
         query = f"SELECT * FROM LECTURER WHERE Id = %s"
-        records = db.run_query(query=query, args=(id))
+        records = cached_query(('LECTURER',), ('LECTURER', 'item', str(id)),
+                               lambda: db.run_query(query=query, args=(id)))
         response = get_response_msg(records[0], HTTPStatus.OK)
-        db.close_connection()
         return response
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -205,13 +775,13 @@ def getLecturer(id):
 # /api/v1/restriction/{Id}
 @app.route(f"{route_prefix}/restrictions/<id>", methods=['GET'])
 @jwt_required()
+@conditional('RESTRICTION')
 def getRestriction(id):
     try:
-        db = Database(conf)
+        db = get_db()
         query = f"SELECT * FROM RESTRICTION WHERE Id = %s"
         records = db.run_query(query=query, args=(id))
         response = get_response_msg(records[0], HTTPStatus.OK)
-        db.close_connection()
         return response
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -222,13 +792,13 @@ def getRestriction(id):
 # /api/v1/occupations/{Id}
 @app.route(f"{route_prefix}/occupations/<id>", methods=['GET'])
 @jwt_required()
+@conditional('OCCUPATION')
 def getOccupation(id):
     try:
-        db = Database(conf)
+        db = get_db()
         query = f"SELECT * FROM OCCUPATION WHERE Id = %s"
         records = db.run_query(query=query, args=(id))
         response = get_response_msg(records[0], HTTPStatus.OK)
-        db.close_connection()
         return response
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -240,15 +810,17 @@ def getOccupation(id):
 
 @app.route(f"{route_prefix}/events", methods=['GET'])
 @jwt_required()
+@conditional('EVENT')
 def getEvents():
     try:
-        db = Database(conf)
+        db = get_db()
         # db.ping() # reconnecting mysql
-        query = f"SELECT * FROM EVENT"
-        records = db.run_query(query=query)
-        response = get_response_msg(records, HTTPStatus.OK)
+        query, params, limit = build_list_query("EVENT")
+        if stream_requested() and limit is None:
+            return get_stream_msg(db.stream_query(query=query, args=params), HTTPStatus.OK)
+        records = db.run_query(query=query, args=params)
+        response = get_list_msg(records, HTTPStatus.OK, limit)
 
-        db.close_connection()
         return response
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -260,14 +832,16 @@ def getEvents():
 
 @app.route(f"{route_prefix}/occupations", methods=['GET'])
 @jwt_required()
+@conditional('OCCUPATION')
 def getOccupations():
     try:
-        db = Database(conf)
-        query = f"SELECT * FROM OCCUPATION"
-        records = db.run_query(query=query)
-        response = get_response_msg(records, HTTPStatus.OK)
+        db = get_db()
+        query, params, limit = build_list_query("OCCUPATION")
+        if stream_requested() and limit is None:
+            return get_stream_msg(db.stream_query(query=query, args=params), HTTPStatus.OK)
+        records = db.run_query(query=query, args=params)
+        response = get_list_msg(records, HTTPStatus.OK, limit)
 
-        db.close_connection()
         return response
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -279,14 +853,16 @@ def getOccupations():
 
 @app.route(f"{route_prefix}/restrictions", methods=['GET'])
 @jwt_required()
+@conditional('RESTRICTION')
 def getRestrictions():
     try:
-        db = Database(conf)
-        query = f"SELECT * FROM RESTRICTION"
-        records = db.run_query(query=query)
-        response = get_response_msg(records, HTTPStatus.OK)
+        db = get_db()
+        query, params, limit = build_list_query("RESTRICTION")
+        if stream_requested() and limit is None:
+            return get_stream_msg(db.stream_query(query=query, args=params), HTTPStatus.OK)
+        records = db.run_query(query=query, args=params)
+        response = get_list_msg(records, HTTPStatus.OK, limit)
 
-        db.close_connection()
         return response
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -298,13 +874,16 @@ def getRestrictions():
 # /api/v1/lecturers
 @app.route(f"{route_prefix}/lecturers", methods=['GET'])
 @jwt_required()
+@conditional('LECTURER')
 def getLecturers():
     try:
-        db = Database(conf)
-        query = f"SELECT * FROM LECTURER"
-        records = db.run_query(query=query)
-        response = get_response_msg(records, HTTPStatus.OK)
-        db.close_connection()
+        db = get_db()
+        query, params, limit = build_list_query("LECTURER")
+        if stream_requested() and limit is None:
+            return get_stream_msg(db.stream_query(query=query, args=params), HTTPStatus.OK)
+        records = cached_query(('LECTURER',), ('LECTURER', 'list', request.query_string),
+                               lambda: db.run_query(query=query, args=params))
+        response = get_list_msg(records, HTTPStatus.OK, limit)
         return response
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -315,13 +894,39 @@ def getLecturers():
 # /api/v1/rooms
 @app.route(f"{route_prefix}/rooms", methods=['GET'])
 @jwt_required()
+@conditional('ROOM')
 def getRooms():
     try:
-        db = Database(conf)
-        query = f"SELECT * FROM ROOM"
-        records = db.run_query(query=query)
+        db = get_db()
+        query, params, limit = build_list_query("ROOM")
+        if stream_requested() and limit is None:
+            return get_stream_msg(db.stream_query(query=query, args=params), HTTPStatus.OK)
+        records = cached_query(('ROOM',), ('ROOM', 'list', request.query_string),
+                               lambda: db.run_query(query=query, args=params))
+        response = get_list_msg(records, HTTPStatus.OK, limit)
+        return response
+    except pymysql.MySQLError as sqle:
+        abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
+    except Exception as e:
+        abort(HTTPStatus.BAD_REQUEST, description=str(e))
+
+
+# /api/v1/rooms/available?weekday=&start=&end=&min_capacity=
+@app.route(f"{route_prefix}/rooms/available", methods=['GET'])
+@jwt_required()
+@conditional('ROOM', 'EVENT', 'OCCUPATION')
+def getAvailableRooms():
+    """Rooms with no event or occupation overlapping the given span of a weekday."""
+    try:
+        db = get_db()
+        for arg in ('weekday', 'start', 'end'):
+            if not request.args.get(arg):
+                raise ValueError(f"{arg} is required")
+        weekday = int(request.args['weekday'])
+        min_capacity = int(request.args.get('min_capacity', 0))
+        records = get_room_availability(db).free_rooms(weekday, request.args['start'], request.args['end'],
+                                                       min_capacity)
         response = get_response_msg(records, HTTPStatus.OK)
-        db.close_connection()
         return response
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -332,34 +937,15 @@ def getRooms():
 # /api/v1/blocks
 @app.route(f"{route_prefix}/blocks", methods=['GET'])
 @jwt_required()
+@conditional('BLOCK', 'BLOCK_TO_EVENT')
 def getBlocks():
     try:
-        db = Database(conf)
-        query = f"""
-        SELECT
-            b.Id AS Id, 
-            b.Name AS Name,
-            b.NameAbbr as NameAbbr,
-            b.Hide as Hide,
-            GROUP_CONCAT(be.EventId) AS AssociatedEventIds
-        FROM 
-            BLOCK b
-        LEFT JOIN 
-            BLOCK_TO_EVENT be ON b.Id = be.BlockId
-        GROUP BY 
-            b.Id, b.Name;
-        """
-        records = db.run_query(query=query)
-        for record in records:
-            try:
-                record['AssociatedEventIds'] = [
-                    int(event_id) for event_id in record['AssociatedEventIds'].split(',')]
-            except:
-                # case where record['AssociatedEventIds'] = null
-                record['AssociatedEventIds'] = []
-        response = get_response_msg(records, HTTPStatus.OK)
+        db = get_db()
+        query, params, limit = build_blocks_query()
+        records = cached_query(('BLOCK', 'BLOCK_TO_EVENT'), ('BLOCK', 'list', request.query_string),
+                               lambda: split_associated_event_ids(db.run_query(query=query, args=params)))
+        response = get_list_msg(records, HTTPStatus.OK, limit)
 
-        db.close_connection()
         return response
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -374,35 +960,29 @@ def createBlock():
         # Parse the JSON data from the POST request
         data = request.get_json()
 
-        # Create a database connection
-        db = Database(conf)
+        # Check out the request's database connection
+        db = get_db()
         conn = db.get_connection()
 
-        # Insert a new block into the database
-        query = """
-        INSERT INTO BLOCK (Name, NameAbbr, Hide)
-        VALUES (%s, %s, %s)
-        """
-        cursor = conn.cursor()
-        cursor.execute(query, (data['Name'], data['NameAbbr'], data['Hide']))
-
-        # Retrieve the ID of the newly created block
-        new_block_id = cursor.lastrowid
-
-        # Update the block's associated events
-        if 'AssociatedEventIds' in data:
-            insert_query = """
-            INSERT INTO BLOCK_TO_EVENT (BlockId, EventId)
-            VALUES (%s, %s)
+        # Everything below is committed at the end of the block
+        with db.transaction():
+            # Insert a new block into the database
+            query = """
+            INSERT INTO BLOCK (Name, NameAbbr, Hide)
+            VALUES (%s, %s, %s)
             """
-            for event_id in data['AssociatedEventIds']:
-                cursor.execute(insert_query, (new_block_id, event_id))
+            cursor = conn.cursor()
+            cursor.execute(query, (data['Name'], data['NameAbbr'], data['Hide']))
 
-        # Commit the changes to the database
-        conn.commit()
+            # Retrieve the ID of the newly created block
+            new_block_id = cursor.lastrowid
 
-        # Close the cursor and database connection
-        db.close_connection()
+            # Associate the block's events
+            if 'AssociatedEventIds' in data:
+                set_block_events(cursor, new_block_id, data['AssociatedEventIds'], current=set())
+
+            seq = record_change(db, 'blocks', new_block_id, 'insert')
+        table_changed('BLOCK', 'BLOCK_TO_EVENT', seq=seq)
 
         return getBlock(new_block_id), HTTPStatus.CREATED
 
@@ -416,7 +996,7 @@ def createBlock():
 @jwt_required()
 def createLecturer():
     try:
-        db = Database(conf)
+        db = get_db()
         body = request.get_json()
         name = body['Name']
         nameAbbr = body['NameAbbr']
@@ -424,8 +1004,10 @@ def createLecturer():
         hide = body['Hide']
         params = [name, nameAbbr, office, hide]
         query = f"INSERT INTO LECTURER(Name, NameAbbr, Office, Hide) VALUES (%s, %s, %s, %s)"
-        records = db.run_query(query=query, args=tuple(params))
-        db.close_connection()
+        with db.transaction():
+            records = db.run_query(query=query, args=tuple(params))
+            seq = record_change(db, 'lecturers', records['id'], 'insert')
+        table_changed('LECTURER', seq=seq)
         return getLecturer(records['id'])
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -439,7 +1021,7 @@ def createLecturer():
 @jwt_required()
 def createRoom():
     try:
-        db = Database(conf)
+        db = get_db()
         body = request.get_json()
         name = body['Name']
         nameAbbr = body['NameAbbr']
@@ -448,7 +1030,11 @@ def createRoom():
         hide = body['Hide']
         params = [name, nameAbbr, number, capacity, hide]
         query = f"INSERT INTO ROOM(Name, NameAbbr, Number, Capacity, Hide) VALUES (%s, %s, %s, %s, %s)"
-        records = db.run_query(query=query, args=tuple(params))
+        with db.transaction():
+            records = db.run_query(query=query, args=tuple(params))
+            row = read_written_row(db, 'ROOM', records['id'])
+            seq = record_change(db, 'rooms', records['id'], 'insert')
+        table_changed('ROOM', row_id=records['id'], row=row, seq=seq)
         return getRoom(records['id'])
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -460,7 +1046,7 @@ def createRoom():
 @jwt_required()
 def createEvent():
     try:
-        db = Database(conf)
+        db = get_db()
         body = request.get_json()
         query_part1 = "INSERT INTO EVENT (Subject, SubjectAbbr, "
         query_part2 = ") VALUES (%s, %s, "
@@ -491,8 +1077,20 @@ def createEvent():
             query_part2 += " %s,"
             params.append(body['Hide'])
         query = query_part1[:-1] + query_part2[:-1] + ")"
-        records = db.run_query(query=query, args=tuple(params))
-        db.close_connection()
+
+        # Only the new event's (weekday, room) and (weekday, lecturer) buckets are looked at
+        mode = conflict_check_mode()
+        clashes = get_clash_index(db).check_event(body) if mode != 'off' else {}
+        if clashes and mode == 'reject':
+            return get_response_msg(clashes, HTTPStatus.CONFLICT)
+
+        with db.transaction():
+            records = db.run_query(query=query, args=tuple(params))
+            row = read_written_row(db, 'EVENT', records['id'])
+            seq = record_change(db, 'events', records['id'], 'insert')
+        table_changed('EVENT', row_id=records['id'], row=row, seq=seq)
+        if clashes:
+            return get_response_msg(row, HTTPStatus.OK, conflicts=clashes)
         return getEvent(records['id'])
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -504,12 +1102,15 @@ def createEvent():
 @jwt_required()
 def createRestriction():
     try:
-        db = Database(conf)
+        db = get_db()
         body = request.get_json()
         query = "INSERT INTO RESTRICTION (LecturerId, Type, StartTime, EndTime, WeekDay) VALUES (%s, %s, %s, %s, %s)"
         params = [body['LecturerId'], body['Type'], body['StartTime'], body['EndTime'], body['WeekDay']]
-        records = db.run_query(query=query, args=tuple(params))
-        db.close_connection()
+        with db.transaction():
+            records = db.run_query(query=query, args=tuple(params))
+            row = read_written_row(db, 'RESTRICTION', records['id'])
+            seq = record_change(db, 'restrictions', records['id'], 'insert')
+        table_changed('RESTRICTION', row_id=records['id'], row=row, seq=seq)
         return getRestriction(records['id'])
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -522,12 +1123,15 @@ def createRestriction():
 @jwt_required()
 def createOccupation():
     try:
-        db = Database(conf)
+        db = get_db()
         body = request.get_json()
         query = "INSERT INTO OCCUPATION (RoomId, StartTime, EndTime, WeekDay) VALUES (%s, %s, %s, %s)"
         params = [body['RoomId'], body['StartTime'], body['EndTime'], body['WeekDay']]
-        records = db.run_query(query=query, args=tuple(params))
-        db.close_connection()
+        with db.transaction():
+            records = db.run_query(query=query, args=tuple(params))
+            row = read_written_row(db, 'OCCUPATION', records['id'])
+            seq = record_change(db, 'occupations', records['id'], 'insert')
+        table_changed('OCCUPATION', row_id=records['id'], row=row, seq=seq)
         return getOccupation(records['id'])
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -539,7 +1143,7 @@ def createOccupation():
 @jwt_required()
 def updateEvent(id):
     try:
-        db = Database(conf)
+        db = get_db()
         body = request.get_json()
         query = "UPDATE EVENT SET Subject = %s, SubjectAbbr = %s,"
         params = [body['Subject'], body['SubjectAbbr']]
@@ -564,9 +1168,22 @@ def updateEvent(id):
         query = query[:-1] + " WHERE Id = %s"
         params.append(id)
 
-        records = db.run_query(query=query, args=tuple(params))
-        response = get_response_msg(records,  HTTPStatus.OK)
-        db.close_connection()
+        # Only the event's (weekday, room) and (weekday, lecturer) buckets are looked at
+        mode = conflict_check_mode()
+        clashes = get_clash_index(db).check_event(body, exclude_id=int(id)) if mode != 'off' else {}
+        if clashes and mode == 'reject':
+            return get_response_msg(clashes, HTTPStatus.CONFLICT)
+
+        with db.transaction():
+            db.run_query(query=query, args=tuple(params))
+            row = read_written_row(db, 'EVENT', id)
+            if row is None:
+                # Nothing was written, so nothing is logged
+                return get_response_msg(f"Event with ID {id} not found", HTTPStatus.NOT_FOUND)
+            seq = record_change(db, 'events', id, 'update')
+        table_changed('EVENT', row_id=id, row=row, seq=seq)
+        if clashes:
+            return get_response_msg(row, HTTPStatus.OK, conflicts=clashes)
         return getEvent(id)
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -578,13 +1195,17 @@ def updateEvent(id):
 @jwt_required()
 def updateRoom(id):
     try:
-        db = Database(conf)
+        db = get_db()
         body = request.get_json()
         params = [body['Name'], body['NameAbbr'],  body['Number'], body['Capacity'], body['Hide'], id]
         query = "UPDATE ROOM SET Name=%s, NameAbbr=%s, Number=%s, Capacity=%s, HIDE=%s WHERE Id = %s"
-        records = db.run_query(query=query, args=tuple(params))
-        response = get_response_msg(records,  HTTPStatus.OK)
-        db.close_connection()
+        with db.transaction():
+            db.run_query(query=query, args=tuple(params))
+            row = read_written_row(db, 'ROOM', id)
+            if row is None:
+                return get_response_msg(f"Room with ID {id} not found", HTTPStatus.NOT_FOUND)
+            seq = record_change(db, 'rooms', id, 'update')
+        table_changed('ROOM', row_id=id, row=row, seq=seq)
         return getRoom(id)
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -596,13 +1217,15 @@ def updateRoom(id):
 @jwt_required()
 def updateLect(id):
     try:
-        db = Database(conf)
+        db = get_db()
         body = request.get_json()
         params = [body['Name'], body['NameAbbr'],  body['Office'], body['Hide'], id]
         query = "UPDATE LECTURER SET Name=%s, NameAbbr=%s, Office=%s, HIDE=%s WHERE Id = %s"
-        records = db.run_query(query=query, args=tuple(params))
+        with db.transaction():
+            records = db.run_query(query=query, args=tuple(params))
+            seq = record_change(db, 'lecturers', id, 'update')
+        table_changed('LECTURER', seq=seq)
         response = get_response_msg(records,  HTTPStatus.OK)
-        db.close_connection()
         return getLecturer(id)
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -618,41 +1241,56 @@ def updateBlock(id):
         # Parse the JSON data from the PUT request
         data = request.get_json()
 
-        # Create a database connection
-        db = Database(conf)
+        # Check out the request's database connection
+        db = get_db()
         conn = db.get_connection()
 
-        # Update the block's information
-        query = """
-        UPDATE BLOCK
-        SET Name = %s, NameAbbr = %s, Hide = %s
-        WHERE Id = %s
-        """
-        cursor = conn.cursor()
-        cursor.execute(query, (data['Name'], data['NameAbbr'], data['Hide'], id))
-
-        # Update the block's associated events
-        if 'AssociatedEventIds' in data:
-            # First, delete all existing associations for the block
-            delete_query = """
-            DELETE FROM BLOCK_TO_EVENT
-            WHERE BlockId = %s
+        # Everything below is committed at the end of the block
+        with db.transaction():
+            # Update the block's information
+            query = """
+            UPDATE BLOCK
+            SET Name = %s, NameAbbr = %s, Hide = %s
+            WHERE Id = %s
             """
-            cursor.execute(delete_query, (id))
+            cursor = conn.cursor()
+            cursor.execute(query, (data['Name'], data['NameAbbr'], data['Hide'], id))
 
-            # Then, add the new associations
-            insert_query = """
-            INSERT INTO BLOCK_TO_EVENT (BlockId, EventId)
-            VALUES (%s, %s)
-            """
-            for event_id in data['AssociatedEventIds']:
-                cursor.execute(insert_query, (id, event_id))
+            # Update the block's associated events, only adding and removing what changed
+            if 'AssociatedEventIds' in data:
+                set_block_events(cursor, id, data['AssociatedEventIds'])
 
-        # Commit the changes to the database
-        conn.commit()
+            seq = record_change(db, 'blocks', id, 'update')
+        table_changed('BLOCK', 'BLOCK_TO_EVENT', seq=seq)
 
-        # Close the cursor and database connection
-        db.close_connection()
+        return getBlock(id)
+
+    except pymysql.MySQLError as sqle:
+        abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
+    except Exception as e:
+        abort(HTTPStatus.BAD_REQUEST, description=str(e))
+
+# /api/v1/blocks/<id>/events
+@app.route(f"{route_prefix}/blocks/<id>/events", methods=['PATCH'])
+@jwt_required()
+def patchBlockEvents(id):
+    """Adds and removes events of a block: `{"add": [EventId, ...], "remove": [EventId, ...]}`."""
+    try:
+        data = request.get_json()
+        add = [int(event_id) for event_id in data.get('add', [])]
+        remove = [int(event_id) for event_id in data.get('remove', [])]
+        if set(add) & set(remove):
+            raise ValueError("An event cannot be both added and removed")
+
+        db = get_db()
+        with db.transaction():
+            with db.get_connection().cursor() as cursor:
+                current = get_block_events(cursor, id)
+                change_block_events(cursor, id,
+                                    add=[event_id for event_id in dict.fromkeys(add) if event_id not in current],
+                                    remove=sorted(current.intersection(remove)))
+            seq = record_change(db, 'blocks', id, 'update')
+        table_changed('BLOCK', 'BLOCK_TO_EVENT', seq=seq)
 
         return getBlock(id)
 
@@ -666,13 +1304,17 @@ def updateBlock(id):
 @jwt_required()
 def updateRestriction(id):
     try:
-        db = Database(conf)
+        db = get_db()
         body = request.get_json()
         params = [body['LecturerId'], body['Type'], body['WeekDay'], body['StartTime'], body['EndTime'], id ]
         query = "UPDATE RESTRICTION SET LecturerId=%s, Type=%s, WeekDay=%s, StartTime=%s, EndTime=%s WHERE Id = %s"
-        records = db.run_query(query=query, args=tuple(params))
-        response = get_response_msg(records,  HTTPStatus.OK)
-        db.close_connection()
+        with db.transaction():
+            db.run_query(query=query, args=tuple(params))
+            row = read_written_row(db, 'RESTRICTION', id)
+            if row is None:
+                return get_response_msg(f"Restriction with ID {id} not found", HTTPStatus.NOT_FOUND)
+            seq = record_change(db, 'restrictions', id, 'update')
+        table_changed('RESTRICTION', row_id=id, row=row, seq=seq)
         return getRestriction(id)
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -685,13 +1327,17 @@ def updateRestriction(id):
 @jwt_required()
 def updateOccupation(id):
     try:
-        db = Database(conf)
+        db = get_db()
         body = request.get_json()
         params = [body['RoomId'], body['WeekDay'], body['StartTime'], body['EndTime'], id ]
         query = "UPDATE OCCUPATION SET RoomId=%s, WeekDay=%s, StartTime=%s, EndTime=%s WHERE Id = %s"
-        records = db.run_query(query=query, args=tuple(params))
-        response = get_response_msg(records,  HTTPStatus.OK)
-        db.close_connection()
+        with db.transaction():
+            db.run_query(query=query, args=tuple(params))
+            row = read_written_row(db, 'OCCUPATION', id)
+            if row is None:
+                return get_response_msg(f"Occupation with ID {id} not found", HTTPStatus.NOT_FOUND)
+            seq = record_change(db, 'occupations', id, 'update')
+        table_changed('OCCUPATION', row_id=id, row=row, seq=seq)
         return getOccupation(id)
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -704,29 +1350,28 @@ def updateOccupation(id):
 @jwt_required()
 def deleteBlock(id):
     try:
-        # Create a database connection
-        db = Database(conf)
+        # Check out the request's database connection
+        db = get_db()
         conn = db.get_connection()
 
-        cursor = conn.cursor()
+        # Everything below is committed at the end of the block
+        with db.transaction():
+            cursor = conn.cursor()
 
-        # First, delete all existing associations for the block
-        delete_block_to_events_query = """
-        DELETE FROM BLOCK_TO_EVENT
-        WHERE BlockId = %s
-        """
-        cursor.execute(delete_block_to_events_query, (id))
-        # Then, delete the block
-        delete_block_query = """
-        DELETE FROM BLOCK WHERE Id =%s
-        """
-        cursor.execute(delete_block_query, (id))
-
-        # Commit the changes to the database
-        conn.commit()
+            # First, delete all existing associations for the block
+            delete_block_to_events_query = """
+            DELETE FROM BLOCK_TO_EVENT
+            WHERE BlockId = %s
+            """
+            cursor.execute(delete_block_to_events_query, (id))
+            # Then, delete the block
+            delete_block_query = """
+            DELETE FROM BLOCK WHERE Id =%s
+            """
+            cursor.execute(delete_block_query, (id))
 
-        # Close the cursor and database connection
-        db.close_connection()
+            seq = record_change(db, 'blocks', id, 'delete')
+        table_changed('BLOCK', 'BLOCK_TO_EVENT', seq=seq)
 
         return get_response_msg({}, HTTPStatus.OK)
 
@@ -740,12 +1385,14 @@ def deleteBlock(id):
 @jwt_required()
 def deleteEvent(id):
     try:
-        db = Database(conf)
+        db = get_db()
         query = f"DELETE FROM EVENT WHERE Id=%s"
         params = [id]
-        records = db.run_query(query=query, args=tuple(params))
+        with db.transaction():
+            records = db.run_query(query=query, args=tuple(params))
+            seq = record_change(db, 'events', id, 'delete')
+        table_changed('EVENT', row_id=id, row=None, seq=seq)
         response = get_response_msg(records,  HTTPStatus.OK)
-        db.close_connection()
         return response
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -757,12 +1404,14 @@ def deleteEvent(id):
 @jwt_required()
 def deleteRoom(id):
     try:
-        db = Database(conf)
+        db = get_db()
         query = f"DELETE FROM ROOM WHERE Id=%s"
         params = [id]
-        records = db.run_query(query=query, args=tuple(params))
+        with db.transaction():
+            records = db.run_query(query=query, args=tuple(params))
+            seq = record_change(db, 'rooms', id, 'delete')
+        table_changed('ROOM', row_id=id, row=None, seq=seq)
         response = get_response_msg(records,  HTTPStatus.OK)
-        db.close_connection()
         return response
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -775,12 +1424,14 @@ def deleteRoom(id):
 @jwt_required()
 def deleteLecturer(id):
     try:
-        db = Database(conf)
+        db = get_db()
         query = f"DELETE FROM LECTURER WHERE Id=%s"
         params = [id]
-        records = db.run_query(query=query, args=tuple(params))
+        with db.transaction():
+            records = db.run_query(query=query, args=tuple(params))
+            seq = record_change(db, 'lecturers', id, 'delete')
+        table_changed('LECTURER', seq=seq)
         response = get_response_msg(records,  HTTPStatus.OK)
-        db.close_connection()
         return response
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -792,12 +1443,14 @@ def deleteLecturer(id):
 @jwt_required()
 def deleteRestriction(id):
     try:
-        db = Database(conf)
+        db = get_db()
         query = f"DELETE FROM RESTRICTION WHERE Id=%s"
         params = [id]
-        records = db.run_query(query=query, args=tuple(params))
+        with db.transaction():
+            records = db.run_query(query=query, args=tuple(params))
+            seq = record_change(db, 'restrictions', id, 'delete')
+        table_changed('RESTRICTION', row_id=id, row=None, seq=seq)
         response = get_response_msg(records,  HTTPStatus.OK)
-        db.close_connection()
         return response
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -810,12 +1463,14 @@ def deleteRestriction(id):
 @jwt_required()
 def deleteOccupation(id):
     try:
-        db = Database(conf)
+        db = get_db()
         query = f"DELETE FROM OCCUPATION WHERE Id=%s"
         params = [id]
-        records = db.run_query(query=query, args=tuple(params))
+        with db.transaction():
+            records = db.run_query(query=query, args=tuple(params))
+            seq = record_change(db, 'occupations', id, 'delete')
+        table_changed('OCCUPATION', row_id=id, row=None, seq=seq)
         response = get_response_msg(records,  HTTPStatus.OK)
-        db.close_connection()
         return response
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
@@ -823,20 +1478,205 @@ def deleteOccupation(id):
     except Exception as e:
         abort(HTTPStatus.BAD_REQUEST, description=str(e))
 
+# /api/v1/schedule
+@app.route(f"{route_prefix}/schedule", methods=['GET'])
+@jwt_required()
+@conditional(*versions.TABLES)
+def getSchedule():
+    """Every collection at once, read from a single consistent snapshot.
+
+    Each collection takes the arguments of its own route prefixed by its
+    name, e.g. `?events.fields=Id,RoomId&rooms.limit=50`.
+    """
+    try:
+        db = get_db()
+        queries = {}
+        for collection, table in schema.COLLECTIONS.items():
+            args = {key[len(collection) + 1:]: value for key, value in request.args.items()
+                    if key.startswith(collection + '.')}
+            queries[collection] = build_blocks_query(args) if table == 'BLOCK' else build_list_query(table, args)
+
+        data = {}
+        next_after_ids = {}
+        with db.transaction(read_only=True, consistent_snapshot=True):
+            # Where a client holding this snapshot should start its /changes polling
+            version = db.run_query(query="SELECT Seq FROM CHANGE_SEQUENCE")[0]['Seq']
+            for collection, (query, params, limit) in queries.items():
+                records = db.run_query(query=query, args=params)
+                if schema.COLLECTIONS[collection] == 'BLOCK':
+                    split_associated_event_ids(records)
+                data[collection] = records
+                if limit is not None:
+                    next_after_ids[collection] = records[-1]['Id'] if len(records) == limit else None
+
+        if next_after_ids:
+            return get_response_msg(data, HTTPStatus.OK, version=version, next_after_id=next_after_ids)
+        return get_response_msg(data, HTTPStatus.OK, version=version)
+    except pymysql.MySQLError as sqle:
+        abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
+    except Exception as e:
+        abort(HTTPStatus.BAD_REQUEST, description=str(e))
+
+# /api/v1/changes
+@app.route(f"{route_prefix}/changes", methods=['GET'])
+@jwt_required()
+def getChanges():
+    """Rows inserted, updated or deleted after the `?since=` sequence number.
+
+    Accepts the same prefixed projection arguments as /schedule. `version` in
+    the response is the `since` to send next time. When changes after
+    `since` were already pruned, the response only carries `reset` and the
+    client should reload through /schedule.
+    """
+    try:
+        since = int(request.args.get('since', 0))
+        db = get_db()
+        with db.transaction(read_only=True, consistent_snapshot=True):
+            if changes_pruned(db, since):
+                return get_response_msg({}, HTTPStatus.OK, reset=True)
+            version, changes = read_changes(db, since, request.args)
+        return get_response_msg(changes, HTTPStatus.OK, version=version)
+    except pymysql.MySQLError as sqle:
+        abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
+    except Exception as e:
+        abort(HTTPStatus.BAD_REQUEST, description=str(e))
+
+# /api/v1/batch
+@app.route(f"{route_prefix}/batch", methods=['POST'])
+@jwt_required()
+def runBatch():
+    """Runs a list of create, update and delete operations as one transaction.
+
+    Consecutive creates of the same collection and columns are sent as one
+    multi-row INSERT. Either every operation is committed or none is; an
+    update or delete of an id that does not exist fails the batch.
+    """
+    try:
+        operations = compile_batch(request.get_json(), conf.BATCH_MAX_OPERATIONS)
+    except Exception as e:
+        abort(HTTPStatus.BAD_REQUEST, description=str(e))
+
+    group = None
+    try:
+        db = get_db()
+        with db.transaction():
+            with db.get_connection().cursor() as cursor:
+                increment = None
+                for group in group_operations(operations):
+                    if len(group) == 1:
+                        for query, params in group[0].steps:
+                            cursor.execute(query, params)
+                        if group[0].op == 'create':
+                            group[0].id = cursor.lastrowid
+                        elif group[0].op == 'delete' and cursor.rowcount == 0:
+                            raise ValueError(f"{group[0].collection} with ID {group[0].id} not found")
+                    else:
+                        cursor.execute(*insert_rows(group))
+                        first_id = cursor.lastrowid
+                        if increment is None:
+                            cursor.execute("SELECT @@auto_increment_increment")
+                            increment = cursor.fetchone()[0]
+                        # InnoDB numbers the rows of one INSERT consecutively, from the first one's id
+                        for position, operation in enumerate(group):
+                            operation.id = first_id + position * increment
+                    for operation in group:
+                        if operation.event_ids is not None:
+                            set_block_events(cursor, operation.id, operation.event_ids,
+                                             current=set() if operation.op == 'create' else None)
+            group = None
+            last_seq = record_changes(db, [operation.change for operation in operations])
+
+            # Rows as they stand at the end of the batch, read once per collection
+            rows = {}
+            for collection in {operation.collection for operation in operations}:
+                ids = {operation.id for operation in operations
+                       if operation.collection == collection and operation.op != 'delete'}
+                rows[collection] = {row['Id']: row for row in fetch_rows(db, collection, ids)}
+
+            # An UPDATE matching nothing is not an error to MySQL: an updated id
+            # that is gone by the end was missing, unless a later delete removed it
+            deleted = set()
+            for operation in reversed(operations):
+                if operation.op == 'delete':
+                    deleted.add((operation.collection, operation.id))
+                elif (operation.op == 'update' and operation.id not in rows[operation.collection]
+                      and (operation.collection, operation.id) not in deleted):
+                    raise ValueError(f"Operation {operation.position}: "
+                                     f"{operation.collection} with ID {operation.id} not found")
+
+        # The operations were logged under consecutive sequence numbers, in order
+        first_seq = last_seq - len(operations) + 1
+        for position, operation in enumerate(operations):
+            tables = (operation.table, 'BLOCK_TO_EVENT') if operation.table == 'BLOCK' else (operation.table,)
+            row = None if operation.op == 'delete' else rows[operation.collection].get(operation.id)
+            table_changed(*tables, row_id=operation.id, row=row, seq=first_seq + position)
+        results = [{'op': operation.op, 'collection': operation.collection, 'id': operation.id,
+                    'row': rows[operation.collection].get(operation.id)} for operation in operations]
+        response = get_response_msg(results, HTTPStatus.OK)
+        return response
+    except pymysql.MySQLError as sqle:
+        abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=describe_batch_error(group, sqle))
+    except Exception as e:
+        abort(HTTPStatus.BAD_REQUEST, description=describe_batch_error(group, e))
+
+# /api/v1/conflicts
+@app.route(f"{route_prefix}/conflicts", methods=['GET'])
+@jwt_required()
+@conditional('EVENT', 'RESTRICTION', 'OCCUPATION')
+def getConflicts():
+    """Room and lecturer double-bookings, and events clashing with a restriction or an occupation."""
+    try:
+        db = get_db()
+        with db.transaction(read_only=True, consistent_snapshot=True):
+            events = db.run_query(query="SELECT Id, RoomId, LecturerId, WeekDay, StartTime, EndTime FROM EVENT")
+            restrictions = db.run_query(query="SELECT * FROM RESTRICTION")
+            occupations = db.run_query(query="SELECT * FROM OCCUPATION")
+        response = get_response_msg(find_conflicts(events, restrictions, occupations), HTTPStatus.OK)
+        return response
+    except pymysql.MySQLError as sqle:
+        abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
+    except Exception as e:
+        abort(HTTPStatus.BAD_REQUEST, description=str(e))
+
+# /api/v1/stream
+@app.route(f"{route_prefix}/stream", methods=['GET'])
+def stream():
+    """The Server-Sent Events feed is served by asgi.py.
+
+    Under the threaded server every open stream would hold a thread for as
+    long as the client stays connected, so it is refused here.
+    """
+    return get_response_msg("The change stream is served by the ASGI app (asgi.py)", HTTPStatus.NOT_IMPLEMENTED)
+
 # /api/v1/health
 @app.route(f"{route_prefix}/health", methods=['GET'])
 def health():
     try:
-        db = Database(conf)
+        db = get_db()
         db_status = "Connected to DB" if db.db_connection_status else "Not connected to DB"
         response = get_response_msg("I am fine! " + db_status, HTTPStatus.OK)
-        db.close_connection()
         return response
     except pymysql.MySQLError as sqle:
         abort(HTTPStatus.INTERNAL_SERVER_ERROR, description=str(sqle))
     except Exception as e:
         abort(HTTPStatus.BAD_REQUEST, description=str(e))
 
+# /api/v1/stats
+@app.route(f"{route_prefix}/stats", methods=['GET'])
+@jwt_required()
+def stats():
+    return get_response_msg({"pool": get_pool(conf).stats(),
+                             "cache": reference_cache.stats(),
+                             "body_cache": body_cache.stats(),
+                             "passwords": password_hasher.stats()}, HTTPStatus.OK)
+
+# /api/v1/metrics
+@app.route(f"{route_prefix}/metrics", methods=['GET'])
+def getMetrics():
+    """Route and query histograms in the Prometheus text format."""
+    data, content_type = metrics.render()
+    return Response(data, status=HTTPStatus.OK, content_type=content_type)
+
 # /
 
 
@@ -871,4 +1711,8 @@ def internal_server_error(e):
 if __name__ == '__main__':
     # Launch the application
     # app.run(host=host, port=port)
-    app.run(ssl_context=('certs/cert.pem', 'certs/key.pem'), host=host, port=port)
+    # Plain HTTP when CERT_FILE is empty, as in gunicorn.conf.py
+    ssl_context = None
+    if conf.CERT_FILE:
+        ssl_context = (os.path.join(conf.BASE_DIR, conf.CERT_FILE), os.path.join(conf.BASE_DIR, conf.KEY_FILE))
+    app.run(ssl_context=ssl_context, host=host, port=port)
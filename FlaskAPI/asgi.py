@@ -0,0 +1,346 @@
+"""
+ASGI entry point serving the read routes of the API on an async MySQL pool.
+
+It answers the same item and list GET routes as app.py for events, rooms,
+lecturers, blocks, restrictions and occupations, plus /health, under the
+same route prefix, tokens and `{status, data}` envelope. Other reads, such
+as /schedule, /changes, /conflicts and /rooms/available, are not served
+here. It is also the only server of
+the /stream feed, which the threaded Flask app refuses. Writes stay on the
+Flask app. Run it with e.g.:
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8001 --workers 4
+"""
+import asyncio
+import contextlib
+import aiomysql
+import jwt
+from http import HTTPStatus
+from werkzeug.exceptions import NotFound
+from starlette.applications import Starlette
+from starlette.exceptions import HTTPException
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+import schema
+from config import ProductionConfig as conf
+from app import app as flask_app, route_prefix, build_list_query, build_blocks_query, split_associated_event_ids
+
+
+class ApiError(Exception):
+    def __init__(self, status_code, description):
+        super().__init__(description)
+        self.status_code = status_code
+        self.description = description
+
+
+def get_response_msg(data, status_code, **extra):
+    """The envelope of app.py's `get_response_msg`, encoded by the same JSON provider."""
+    message = {
+        'status': status_code,
+        'data': data if data else []
+    }
+    message.update(extra)
+    return Response(f"{flask_app.json.dumps(message, separators=(',', ':'))}\n",
+                    status_code=status_code, media_type=flask_app.json.mimetype)
+
+
+def get_error_msg(status_code, description):
+    # Same text as Flask's abort() under app.py's error handlers
+    status = HTTPStatus(status_code)
+    return get_response_msg(f"{status.value} {status.phrase}: {description}", status_code)
+
+
+def verify_jwt(request, locations=('headers',)):
+    """Checks the access token the way `@jwt_required()` does and returns its identity."""
+    token = None
+    header = request.headers.get('Authorization')
+    if header:
+        scheme, _, token = header.partition(' ')
+        if scheme != 'Bearer' or not token:
+            raise ApiError(HTTPStatus.UNAUTHORIZED,
+                           "Missing 'Bearer' type in 'Authorization' header. Expected 'Authorization: Bearer <JWT>'")
+    elif 'query_string' in locations:
+        token = request.query_params.get('jwt')
+    if not token:
+        raise ApiError(HTTPStatus.UNAUTHORIZED, "Missing Authorization Header")
+    try:
+        claims = jwt.decode(token, conf.JWT_SECRET_KEY, algorithms=[flask_app.config.get('JWT_ALGORITHM', 'HS256')])
+    except jwt.ExpiredSignatureError:
+        raise ApiError(HTTPStatus.UNAUTHORIZED, "Token has expired")
+    except jwt.InvalidTokenError as e:
+        raise ApiError(HTTPStatus.UNPROCESSABLE_ENTITY, str(e))
+    if claims.get('type') != 'access':
+        raise ApiError(HTTPStatus.UNPROCESSABLE_ENTITY, "Only non-refresh tokens are allowed")
+    return claims.get('sub')
+
+
+def route(locations=('headers',), auth=True):
+    """Wraps an async view with the token check and app.py's error handling."""
+    def decorator(view):
+        async def endpoint(request):
+            try:
+                if auth:
+                    verify_jwt(request, locations)
+            except ApiError as e:
+                # flask_jwt_extended answers these with {"msg": ...}
+                body = flask_app.json.dumps({'msg': e.description}, separators=(',', ':'))
+                return Response(f"{body}\n", status_code=e.status_code, media_type=flask_app.json.mimetype)
+            try:
+                return await view(request)
+            except ApiError as e:
+                return get_error_msg(e.status_code, e.description)
+            except aiomysql.MySQLError as e:
+                return get_error_msg(HTTPStatus.INTERNAL_SERVER_ERROR, str(e))
+            except Exception as e:
+                return get_error_msg(HTTPStatus.BAD_REQUEST, str(e))
+        return endpoint
+    return decorator
+
+
+pool = None
+
+
+async def fetch(query, args=()):
+    """Runs a SELECT on a pooled connection and returns its rows as dicts."""
+    try:
+        conn = await asyncio.wait_for(pool.acquire(), conf.DB_POOL_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise ApiError(HTTPStatus.SERVICE_UNAVAILABLE, "Timed out waiting for a database connection")
+    try:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(query, args)
+            return list(await cursor.fetchall())
+    finally:
+        pool.release(conn)
+
+
+async def fetch_rows(collection, args, ids=None):
+    """Reads a collection as its app.py route does, optionally restricted to `ids`."""
+    if schema.COLLECTIONS[collection] == 'BLOCK':
+        query, params, limit = build_blocks_query(args, ids=ids)
+        return split_associated_event_ids(await fetch(query, params)), limit
+    query, params, limit = build_list_query(schema.COLLECTIONS[collection], args, ids=ids)
+    return await fetch(query, params), limit
+
+
+def list_route(collection):
+    @route()
+    async def view(request):
+        records, limit = await fetch_rows(collection, request.query_params)
+        if limit is None:
+            return get_response_msg(records, HTTPStatus.OK)
+        next_after_id = records[-1]['Id'] if len(records) == limit else None
+        return get_response_msg(records, HTTPStatus.OK, next_after_id=next_after_id)
+    return view
+
+
+def item_route(collection):
+    @route()
+    async def view(request):
+        records, _ = await fetch_rows(collection, {}, ids=[request.path_params['id']])
+        if not records:
+            if collection == 'events':
+                # getEvent's abort(404) is caught by its own `except Exception` and turned into a 400
+                raise ApiError(HTTPStatus.BAD_REQUEST,
+                               f"404 Not Found: Event with ID {request.path_params['id']} not found")
+            # The error app.py's records[0] ends up as
+            raise ApiError(HTTPStatus.BAD_REQUEST, "list index out of range")
+        return get_response_msg(records[0], HTTPStatus.OK)
+    return view
+
+
+@route(auth=False)
+async def health(request):
+    try:
+        await fetch("SELECT 1")
+        db_status = "Connected to DB"
+    except Exception:
+        db_status = "Not connected to DB"
+    return get_response_msg("I am fine! " + db_status, HTTPStatus.OK)
+
+
+class ChangeFeed:
+    """Fans change notifications out to every stream of this process: one task polls CHANGE_LOG for all of them."""
+
+    def __init__(self, interval, maxlen):
+        self.__interval = interval
+        self.__maxlen = maxlen
+        self.__subscribers = set()
+        self.__task = None
+        self.last_seq = None
+
+    async def subscribe(self):
+        """Returns a queue receiving every change committed after the feed's `last_seq`.
+
+        Once this returns, `last_seq` is set, so a backlog read afterwards
+        overlaps the live frames instead of leaving a gap before them.
+        """
+        if self.last_seq is None:
+            seq = (await fetch("SELECT Seq FROM CHANGE_SEQUENCE"))[0]['Seq']
+            if self.last_seq is None:
+                self.last_seq = seq
+        queue = asyncio.Queue()
+        self.__subscribers.add(queue)
+        if self.__task is None:
+            self.__task = asyncio.get_running_loop().create_task(self.__run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.__subscribers.discard(queue)
+
+    async def __run(self):
+        try:
+            while self.__subscribers:
+                frames = []
+                try:
+                    frames = await read_frames(self.last_seq, 500)
+                except Exception:
+                    # The database may be briefly unavailable; try again later
+                    pass
+                for queue in list(self.__subscribers):
+                    if queue.qsize() + len(frames) > self.__maxlen:
+                        # Too far behind; None makes the stream send a reset
+                        queue.put_nowait(None)
+                        self.__subscribers.discard(queue)
+                        continue
+                    for frame in frames:
+                        queue.put_nowait(frame)
+                if frames:
+                    self.last_seq = frames[-1][0]
+                else:
+                    await asyncio.sleep(self.__interval)
+        finally:
+            self.__task = None
+            self.last_seq = None
+
+
+async def read_frames(since, limit):
+    """Reads the changes after `since` as Server-Sent Events frames."""
+    logged = await fetch("SELECT Seq, Entity, EntityId, Operation FROM CHANGE_LOG WHERE Seq > %s ORDER BY Seq LIMIT %s",
+                         (since, limit))
+    ids = {}
+    for change in logged:
+        if change['Operation'] != 'delete':
+            ids.setdefault(change['Entity'], set()).add(change['EntityId'])
+    rows = {}
+    for collection, collection_ids in ids.items():
+        collection_ids = list(collection_ids)
+        for start in range(0, len(collection_ids), 1000):
+            records, _ = await fetch_rows(collection, {}, ids=collection_ids[start:start + 1000])
+            rows.update({(collection, row['Id']): row for row in records})
+    frames = []
+    for change in logged:
+        notification = {
+            'seq': change['Seq'],
+            'entity': change['Entity'],
+            'id': change['EntityId'],
+            'operation': change['Operation'],
+            'row': rows.get((change['Entity'], change['EntityId'])) if change['Operation'] != 'delete' else None,
+        }
+        frames.append((change['Seq'],
+                       f"id: {change['Seq']}\nevent: change\ndata: {flask_app.json.dumps(notification, separators=(',', ':'))}\n\n"))
+    return frames
+
+
+async def changes_pruned(since):
+    """Whether changes logged after `since` may have been pruned, as app.py's `changes_pruned`.
+
+    Pruning only moves forward, so checked after reading the changes, a
+    False means that none of the ones read were missing.
+    """
+    first = (await fetch("SELECT MIN(Seq) AS Seq FROM CHANGE_LOG"))[0]['Seq']
+    if first is None:
+        first = (await fetch("SELECT Seq FROM CHANGE_SEQUENCE"))[0]['Seq'] + 1
+    return since < first - 1
+
+
+change_feed = ChangeFeed(conf.STREAM_POLL_INTERVAL, conf.STREAM_BACKLOG)
+
+
+@route(locations=('headers', 'query_string'))
+async def stream(request):
+    """Server-Sent Events feed with one `change` event per committed write, without a thread per client.
+
+    A reconnecting client sends `Last-Event-ID` and is first sent what it
+    missed. A client too far behind, or whose missed changes were pruned
+    from CHANGE_LOG, gets a `reset` event and should reload through
+    /schedule.
+    """
+    resume_from = request.headers.get('Last-Event-ID')
+    resume_from = int(resume_from) if resume_from else None
+    queue = await change_feed.subscribe()
+    try:
+        # Read after subscribing, so it reaches at least the feed's last_seq and
+        # nothing falls between the two; duplicates are skipped below
+        backlog = await read_frames(resume_from, conf.STREAM_BACKLOG) if resume_from is not None else []
+        reset = resume_from is not None and (len(backlog) >= conf.STREAM_BACKLOG
+                                             or await changes_pruned(resume_from))
+    except Exception:
+        change_feed.unsubscribe(queue)
+        raise
+
+    async def generate(resume_from):
+        try:
+            yield "retry: 3000\n\n"
+            if reset:
+                yield "event: reset\ndata: {}\n\n"
+                return
+            for seq, frame in backlog:
+                resume_from = seq
+                yield frame
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), conf.STREAM_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if frame is None:
+                    yield "event: reset\ndata: {}\n\n"
+                    return
+                seq, text = frame
+                if resume_from is None or seq > resume_from:
+                    yield text
+        finally:
+            change_feed.unsubscribe(queue)
+
+    return StreamingResponse(generate(resume_from), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    global pool
+    pool = await aiomysql.create_pool(
+        host=conf.DB_HOST,
+        port=int(conf.DB_PORT),
+        user=conf.DB_USER,
+        password=conf.DB_PASSWD,
+        db=conf.DB_NAME,
+        connect_timeout=conf.CONNECT_TIMEOUT,
+        minsize=conf.DB_POOL_SIZE,
+        maxsize=conf.DB_POOL_SIZE + conf.DB_POOL_MAX_OVERFLOW,
+        pool_recycle=conf.DB_POOL_RECYCLE,
+        autocommit=True,
+    )
+    try:
+        yield
+    finally:
+        pool.close()
+        await pool.wait_closed()
+
+
+routes = [
+    Route(f"{route_prefix}/health", health),
+    Route(f"{route_prefix}/stream", stream),
+]
+for collection in schema.COLLECTIONS:
+    routes.append(Route(f"{route_prefix}/{collection}", list_route(collection)))
+    routes.append(Route(f"{route_prefix}/{collection}/{{id:int}}", item_route(collection)))
+
+async def not_found(request, exc):
+    # app.py's 404 handler, with werkzeug's description of an unknown URL
+    return get_error_msg(HTTPStatus.NOT_FOUND, NotFound.description)
+
+
+app = Starlette(routes=routes, lifespan=lifespan, exception_handlers={HTTPStatus.NOT_FOUND.value: not_found})
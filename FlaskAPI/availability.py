@@ -0,0 +1,137 @@
+import threading
+import numpy as np
+from conflicts import to_seconds
+from schema import TABLE_COLUMNS
+
+
+class RoomAvailability:
+    """Per-room, per-weekday occupancy of the day in fixed-size slots.
+
+    For every weekday there is a (rooms x slots) array counting the events
+    and occupations that cover each slot of each room, so asking which rooms
+    are free over a span is a single `any` over a slice of it. Spans are
+    widened to whole slots. Counts rather than booleans let a booking be
+    taken out again without rebuilding the rest. Like `ClashIndex`, it is
+    loaded once, then updated write by write, and `seq` is the CHANGE_LOG
+    sequence number it reflects every write up to.
+    """
+
+    TABLES = ('ROOM', 'EVENT', 'OCCUPATION')
+    DAY_SECONDS = 24 * 3600
+
+    def __init__(self, slot_minutes=5):
+        self.lock = threading.RLock()
+        self.seq = None
+        self.slot_seconds = slot_minutes * 60
+        self.slots = -(-self.DAY_SECONDS // self.slot_seconds)
+        self.__reset()
+
+    def __reset(self):
+        self.__rooms = {}  # id -> row
+        self.__position = {}  # id -> row of the arrays
+        self.__ids = np.zeros(0, dtype=np.int64)
+        self.__capacity = np.zeros(0, dtype=np.int64)
+        self.__present = np.zeros(0, dtype=bool)
+        self.__days = {}  # weekday -> (rooms x slots) counts
+        self.__entries = {'EVENT': {}, 'OCCUPATION': {}}  # id -> (weekday, room id, first slot, end slot)
+
+    def load(self, rows_by_table, seq):
+        """Replaces everything with `rows_by_table` ({table: rows}), read as of `seq`."""
+        with self.lock:
+            self.__reset()
+            for row in rows_by_table['ROOM']:
+                self.__set_room(row['Id'], row)
+            for table in ('EVENT', 'OCCUPATION'):
+                for row in rows_by_table[table]:
+                    self.__book(table, row['Id'], row)
+            self.seq = seq
+
+    def apply(self, table, row_id, row, seq):
+        """Applies a committed write: `row` is the new row, or None when deleted.
+
+        Same rules as `ClashIndex.apply`.
+        """
+        with self.lock:
+            if self.seq is None or seq <= self.seq:
+                return
+            if table in self.TABLES and row_id is not None:
+                self.__set(table, row_id, row)
+            if seq == self.seq + 1:
+                self.seq = seq
+
+    def catch_up(self, changes, seq):
+        """Applies the (table, id, row) writes read back from CHANGE_LOG up to `seq`."""
+        with self.lock:
+            # Rooms first, so that the bookings of a new room find it
+            for table, row_id, row in sorted(changes, key=lambda change: change[0] != 'ROOM'):
+                self.__set(table, row_id, row)
+            self.seq = max(self.seq, seq)
+
+    def free_rooms(self, weekday, start, end, min_capacity=0):
+        """Returns the rooms with at least `min_capacity` seats free from `start` to `end`."""
+        span = self.__span(start, end)
+        if span is None:
+            raise ValueError("end must be after start")
+        with self.lock:
+            free = self.__present & (self.__capacity >= min_capacity)
+            counts = self.__days.get(int(weekday))
+            if counts is not None:
+                free &= ~counts[:, span[0]:span[1]].any(axis=1)
+            return [self.__rooms[room_id] for room_id in self.__ids[free].tolist()]
+
+    def __span(self, start, end):
+        start, end = to_seconds(start), to_seconds(end)
+        if start is None or end is None or end <= start:
+            return None
+        first = max(start, 0) // self.slot_seconds
+        last = -(-min(end, self.DAY_SECONDS) // self.slot_seconds)
+        return (first, last) if first < last else None
+
+    def __set(self, table, row_id, row):
+        if table == 'ROOM':
+            self.__set_room(row_id, row)
+        else:
+            self.__unbook(table, row_id)
+            if row is not None:
+                self.__book(table, row_id, row)
+
+    def __set_room(self, room_id, row):
+        if room_id not in self.__position:
+            if row is None:
+                return
+            self.__position[room_id] = len(self.__ids)
+            self.__ids = np.append(self.__ids, room_id)
+            self.__capacity = np.append(self.__capacity, 0)
+            self.__present = np.append(self.__present, False)
+            for weekday, counts in self.__days.items():
+                self.__days[weekday] = np.vstack((counts, np.zeros((1, self.slots), dtype=counts.dtype)))
+        position = self.__position[room_id]
+        if row is None:
+            # Rooms with bookings cannot be deleted, so its row is all zeros
+            self.__rooms.pop(room_id, None)
+            self.__present[position] = False
+            return
+        # Only the ROOM columns, so rooms are listed as `GET /rooms` returns them
+        self.__rooms[room_id] = dict({column: row.get(column) for column in TABLE_COLUMNS['ROOM']}, Id=room_id)
+        self.__capacity[position] = int(row['Capacity'])
+        self.__present[position] = True
+
+    def __book(self, table, row_id, row):
+        try:
+            weekday, room_id = int(row['WeekDay']), int(row['RoomId'])
+            span = self.__span(row['StartTime'], row['EndTime'])
+        except (KeyError, TypeError, ValueError):
+            return
+        if span is None or room_id not in self.__position:
+            return
+        counts = self.__days.get(weekday)
+        if counts is None:
+            counts = self.__days[weekday] = np.zeros((len(self.__ids), self.slots), dtype=np.uint16)
+        counts[self.__position[room_id], span[0]:span[1]] += 1
+        self.__entries[table][row_id] = (weekday, room_id, span[0], span[1])
+
+    def __unbook(self, table, row_id):
+        entry = self.__entries[table].pop(row_id, None)
+        if entry is not None:
+            weekday, room_id, first, last = entry
+            self.__days[weekday][self.__position[room_id], first:last] -= 1
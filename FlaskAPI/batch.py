@@ -0,0 +1,126 @@
+from schema import COLLECTIONS
+
+
+## Columns set by the create and update routes of each collection
+WRITABLE_COLUMNS = {
+    'events': ('Subject', 'SubjectAbbr', 'StartTime', 'EndTime', 'WeekDay', 'RoomId', 'LecturerId', 'Hide'),
+    'rooms': ('Name', 'NameAbbr', 'Number', 'Capacity', 'Hide'),
+    'lecturers': ('Name', 'NameAbbr', 'Office', 'Hide'),
+    'blocks': ('Name', 'NameAbbr', 'Hide'),
+    'restrictions': ('LecturerId', 'Type', 'StartTime', 'EndTime', 'WeekDay'),
+    'occupations': ('RoomId', 'StartTime', 'EndTime', 'WeekDay'),
+}
+
+OPERATIONS = ('create', 'update', 'delete')
+
+
+class Operation:
+    """One write of a batch, compiled to the statements that carry it out.
+
+    `steps` is a list of (query, params); a create has a single INSERT step
+    whose generated id becomes `id`. `event_ids` is the membership a block
+    is set to, or None to leave it as it is.
+    """
+
+    def __init__(self, position, op, collection, id, body, steps, event_ids=None):
+        self.position = position
+        self.op = op
+        self.collection = collection
+        self.table = COLLECTIONS[collection]
+        self.id = id
+        self.body = body
+        self.steps = steps
+        self.event_ids = event_ids
+
+    @property
+    def shape(self):
+        """Creates of the same shape can share one multi-row INSERT."""
+        if self.op != 'create':
+            return None
+        return (self.collection, self.steps[0][0])
+
+    @property
+    def change(self):
+        """The (collection, id, operation) entry written to CHANGE_LOG."""
+        return self.collection, self.id, 'insert' if self.op == 'create' else self.op
+
+
+def compile_operation(position, operation):
+    """Validates one `{"op", "collection", "id", "body"}` entry of a batch.
+
+    Raises ValueError naming the entry.
+    """
+    if not isinstance(operation, dict):
+        raise ValueError(f"Operation {position} must be an object")
+    op, collection = operation.get('op'), operation.get('collection')
+    if op not in OPERATIONS:
+        raise ValueError(f"Operation {position}: op must be one of {', '.join(OPERATIONS)}")
+    if collection not in WRITABLE_COLUMNS:
+        raise ValueError(f"Operation {position}: unknown collection '{collection}'")
+    table = COLLECTIONS[collection]
+    body = operation.get('body') or {}
+    row_id = None
+    if op != 'create':
+        try:
+            row_id = int(operation['id'])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError(f"Operation {position}: {op} needs an integer id")
+
+    event_ids = None
+    if collection == 'blocks' and op != 'delete' and 'AssociatedEventIds' in body:
+        event_ids = [int(event_id) for event_id in body['AssociatedEventIds']]
+
+    if op == 'create':
+        # As in the create routes, columns left out of the body get their defaults
+        columns = [column for column in WRITABLE_COLUMNS[collection] if column in body]
+        if not columns:
+            raise ValueError(f"Operation {position}: nothing to create")
+        query = (f"INSERT INTO {table} ({', '.join(columns)}) "
+                 f"VALUES ({', '.join(['%s'] * len(columns))})")
+        steps = [(query, tuple(body[column] for column in columns))]
+    elif op == 'update':
+        columns = WRITABLE_COLUMNS[collection]
+        missing = [column for column in columns if column not in body]
+        if missing:
+            raise ValueError(f"Operation {position}: missing {', '.join(missing)}")
+        query = f"UPDATE {table} SET {', '.join(f'{column} = %s' for column in columns)} WHERE Id = %s"
+        steps = [(query, tuple(body[column] for column in columns) + (row_id,))]
+    else:
+        steps = [(f"DELETE FROM {table} WHERE Id = %s", (row_id,))]
+        if table == 'BLOCK':
+            steps.insert(0, ("DELETE FROM BLOCK_TO_EVENT WHERE BlockId = %s", (row_id,)))
+    return Operation(position, op, collection, row_id, body, steps, event_ids)
+
+
+def compile_batch(operations, max_operations=1000):
+    """Compiles a batch, checking every entry before anything is written."""
+    if not isinstance(operations, list) or not operations:
+        raise ValueError("The body must be a non-empty list of operations")
+    if len(operations) > max_operations:
+        raise ValueError(f"A batch holds at most {max_operations} operations")
+    return [compile_operation(position, operation) for position, operation in enumerate(operations)]
+
+
+def group_operations(operations):
+    """Splits compiled operations into runs that can each be executed together.
+
+    Only consecutive creates of the same shape are grouped, so the writes
+    still happen in the order they were sent. Every other operation is a run
+    of its own.
+    """
+    groups = []
+    for operation in operations:
+        group = groups[-1] if groups else None
+        if group is not None and operation.shape is not None and group[0].shape == operation.shape:
+            group.append(operation)
+        else:
+            groups.append([operation])
+    return groups
+
+
+def insert_rows(group):
+    """Returns the (query, params) of one INSERT creating the rows of a run of creates."""
+    query, _ = group[0].steps[0]
+    head, values = query.split(" VALUES ")
+    return (f"{head} VALUES {', '.join([values] * len(group))}",
+            tuple(param for operation in group for param in operation.steps[0][1]))
@@ -0,0 +1,70 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class ReadThroughCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds.
+
+    Keys are tuples whose first element is the table the value was read from,
+    so every entry of a table can be dropped at once. Each entry also carries
+    the stamp it was loaded under (e.g. the table versions); an entry is only
+    served to callers presenting the same stamp.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.__maxsize = maxsize
+        self.__ttl = ttl
+        self.__entries = OrderedDict()  # key -> (expires_at, stamp, value)
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        self.__invalidations = 0
+
+    def get_or_load(self, key, loader, stamp=None):
+        """Returns the cached value for `key`, calling `loader()` on a miss."""
+        now = time.monotonic()
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[0] > now and entry[1] == stamp:
+                self.__entries.move_to_end(key)
+                self.__hits += 1
+                return entry[2]
+            self.__misses += 1
+
+        value = loader()
+
+        with self.__lock:
+            self.__entries[key] = (time.monotonic() + self.__ttl, stamp, value)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__maxsize:
+                self.__entries.popitem(last=False)
+                self.__evictions += 1
+        return value
+
+    def invalidate(self, *tables):
+        """Drops every entry read from one of `tables`."""
+        with self.__lock:
+            for key in [key for key in self.__entries if key[0] in tables]:
+                del self.__entries[key]
+                self.__invalidations += 1
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+    def stats(self):
+        """Returns a snapshot of the cache usage."""
+        with self.__lock:
+            lookups = self.__hits + self.__misses
+            return {
+                'size': len(self.__entries),
+                'maxsize': self.__maxsize,
+                'ttl': self.__ttl,
+                'hits': self.__hits,
+                'misses': self.__misses,
+                'hit_ratio': round(self.__hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.__evictions,
+                'invalidations': self.__invalidations,
+            }
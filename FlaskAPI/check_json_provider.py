@@ -0,0 +1,142 @@
+"""
+Checks that the orjson provider encodes responses to the same bytes as the
+stdlib provider it replaced:
+
+    python check_json_provider.py --random 5000
+
+Each value is encoded in the compact form of production responses and in
+the `indent=2` form of debug mode, both with `dumps` and as a full response
+body. Values the baseline provider rejects must be rejected too. `--random`
+adds seeded random rows mixing the same kinds of values. Exits with status
+1 on the first difference.
+"""
+import sys
+import uuid
+import random
+import decimal
+import argparse
+import datetime
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from json_provider import UpdatedJSONProvider, OrjsonProvider, orjson
+
+
+class BaselineJSONProvider(DefaultJSONProvider):
+    """The provider before orjson, kept as the reference."""
+
+    def default(self, o):
+        if isinstance(o, datetime.timedelta):
+            return "{:02d}:{:02d}".format(o.seconds//3600, (o.seconds//60) % 60)
+        return super().default(o)
+
+
+# (name, value)
+CASES = [
+    ("timedelta", datetime.timedelta(hours=9, minutes=30)),
+    ("timedelta of zero", datetime.timedelta(0)),
+    ("timedelta with seconds", datetime.timedelta(hours=23, minutes=59, seconds=59)),
+    ("timedelta over a day", datetime.timedelta(days=1, hours=1, minutes=5)),
+    ("Decimal", decimal.Decimal('12.50')),
+    ("bytes", b'$2b$12$abcdefghijklmnopqrstuv'),
+    ("date", datetime.date(2023, 9, 1)),
+    ("datetime", datetime.datetime(2023, 9, 1, 14, 5, 7)),
+    ("UUID", uuid.UUID('12345678-1234-5678-1234-567812345678')),
+    ("non-ASCII", "Sala Ç, Anfiteatro São João"),
+    ("non-BMP", "Aula \U0001f393"),
+    ("DEL", "a\x7fb"),
+    ("control characters", "\x00\x01\x1f\t\n\"\\"),
+    ("line separators", "\u2028\u2029"),
+    ("integer over 64 bits", 2 ** 64),
+    ("integer keys", {2: 'b', 1: 'a'}),
+    ("unsorted keys", {'b': 1, 'a': [True, False, None], 'c': {'z': 1.5, 'y': -0.25}}),
+    ("event row", {'Id': 7, 'Subject': "Análise Matemática I", 'SubjectAbbr': "AM1", 'LecturerId': 3,
+                   'RoomId': None, 'StartTime': datetime.timedelta(hours=10), 'EndTime': datetime.timedelta(hours=12),
+                   'WeekDay': 2, 'Hide': 0}),
+    ("empty envelope", {'status': 200, 'data': []}),
+    ("envelope", {'status': 200, 'data': [{'Id': 1, 'Name': "Sala\x7f", 'Capacity': 30}], 'next_after_id': None}),
+]
+
+STRINGS = ["", "Sala", "Ç", "ã\x7f", "\U0001f393", "\x00", " ", "\"quoted\"", "back\\slash"]
+
+
+def random_value(rng, depth=0):
+    kind = rng.randrange(10 if depth < 2 else 8)
+    if kind == 0:
+        return datetime.timedelta(seconds=rng.randrange(0, 3 * 24 * 3600))
+    if kind == 1:
+        return decimal.Decimal(rng.randrange(-10 ** 6, 10 ** 6)) / 100
+    if kind == 2:
+        return datetime.date(2020, 1, 1) + datetime.timedelta(days=rng.randrange(2000))
+    if kind == 3:
+        return "".join(rng.choice(STRINGS) for _ in range(rng.randrange(4)))
+    if kind == 4:
+        return rng.randrange(-2 ** 63, 2 ** 63)
+    if kind == 5:
+        return rng.choice((True, False, None))
+    if kind == 6:
+        return rng.random() * 1000
+    if kind == 7:
+        return uuid.UUID(int=rng.getrandbits(128))
+    if kind == 8:
+        return [random_value(rng, depth + 1) for _ in range(rng.randrange(4))]
+    return {rng.choice(("Id", "Name", "StartTime", "Ç", "a\x7f", "0")): random_value(rng, depth + 1)
+            for _ in range(rng.randrange(5))}
+
+
+def encodings(provider, value):
+    """Returns the encodings of `value`, or the name of the error raised, per form."""
+    results = {}
+    forms = {
+        'compact': lambda: provider.dumps(value, separators=(",", ":")).encode(),
+        'indent=2': lambda: provider.dumps(value, indent=2).encode(),
+        'response': lambda: provider.response(value).get_data(),
+    }
+    for form, encode in forms.items():
+        try:
+            results[form] = encode()
+        except Exception as e:
+            results[form] = type(e).__name__
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--random', type=int, default=5000, help="number of random rows to compare as well")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    if orjson is None:
+        sys.exit("orjson is not installed")
+
+    app = Flask(__name__)
+    baseline = BaselineJSONProvider(app)
+    providers = {'UpdatedJSONProvider': UpdatedJSONProvider(app), 'OrjsonProvider': OrjsonProvider(app)}
+    rng = random.Random(args.seed)
+    cases = CASES + [(f"random row {n}", random_value(rng)) for n in range(args.random)]
+
+    with app.app_context():
+        for debug in (False, True):
+            # Debug mode pretty-prints responses
+            app.debug = debug
+            for name, value in cases:
+                expected = encodings(baseline, value)
+                for provider_name, provider in providers.items():
+                    if encodings(provider, value) != expected:
+                        sys.exit(f"{provider_name} differs from the baseline provider on {name} (debug={debug}): "
+                                 f"{value!r}\nexpected {expected}\ngot      {encodings(provider, value)}")
+
+        # Streamed lists (?stream=true) are always compact
+        app.debug = False
+        rows = [value for name, value in CASES if name == "event row"]
+        for provider_name, provider in providers.items():
+            for data in ([], rows):
+                streamed = "".join(provider.stream_envelope(iter(data), 200)).encode()
+                if streamed != baseline.response({'status': 200, 'data': data}).get_data():
+                    sys.exit(f"{provider_name}.stream_envelope differs from the baseline response for {data!r}")
+
+    print(f"{len(cases)} values encode to the same bytes with {', '.join(providers)} as with the baseline provider")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,26 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+## Content codings we can produce, preferred first
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding(accept_encodings):
+    """Returns the best coding the client accepts (werkzeug's `request.accept_encodings`), or None."""
+    return accept_encodings.best_match(ENCODINGS)
+
+
+def compress(data, encoding):
+    """Compresses a response body with `br` or `gzip`.
+
+    The output only depends on `data`, so cached and freshly compressed
+    bodies are the same bytes.
+    """
+    if encoding == 'br':
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6, mtime=0)
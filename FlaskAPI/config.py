@@ -42,6 +42,68 @@ class Config(object):
     ## Application threads
     THREADS_PER_PAGE = CONF_DICT['common']['THREADS_PER_PAGE']
 
+    ## Largest page a collection route returns for `?limit=`
+    MAX_PAGE_SIZE = CONF_DICT['common'].get('MAX_PAGE_SIZE', 1000)
+
+    ## Cache of the ROOM, LECTURER and BLOCK reads (entries, seconds)
+    CACHE_SIZE = CONF_DICT['common'].get('CACHE_SIZE', 1024)
+    CACHE_TTL = CONF_DICT['common'].get('CACHE_TTL', 300)
+
+    ## Server-Sent Events feed (seconds, seconds, events)
+    STREAM_POLL_INTERVAL = CONF_DICT['common'].get('STREAM_POLL_INTERVAL', 1)
+    STREAM_KEEPALIVE = CONF_DICT['common'].get('STREAM_KEEPALIVE', 15)
+    STREAM_BACKLOG = CONF_DICT['common'].get('STREAM_BACKLOG', 1000)
+
+    ## Latest CHANGE_LOG entries kept for /changes and /stream, older ones are pruned (entries, 0 keeps all)
+    CHANGE_LOG_RETENTION = CONF_DICT['common'].get('CHANGE_LOG_RETENTION', 100000)
+
+    ## Default clash check of event writes: off, report or reject
+    CONFLICT_CHECK = CONF_DICT['common'].get('CONFLICT_CHECK', 'off')
+
+    ## Largest number of operations accepted by /batch
+    BATCH_MAX_OPERATIONS = CONF_DICT['common'].get('BATCH_MAX_OPERATIONS', 1000)
+
+    ## Responses of at least COMPRESS_MIN_SIZE bytes are sent with br or gzip (bytes, entries)
+    COMPRESS_MIN_SIZE = CONF_DICT['common'].get('COMPRESS_MIN_SIZE', 1024)
+    COMPRESS_CACHE_SIZE = CONF_DICT['common'].get('COMPRESS_CACHE_SIZE', 256)
+
+    ## JSON encoder: orjson (used when installed) or default (stdlib)
+    JSON_PROVIDER = CONF_DICT['common'].get('JSON_PROVIDER', 'orjson')
+
+    ## Slot size of the room availability index (minutes)
+    AVAILABILITY_SLOT_MINUTES = CONF_DICT['common'].get('AVAILABILITY_SLOT_MINUTES', 5)
+
+    ## bcrypt cost factor of new hashes, and the processes hashing passwords (processes, waiting logins)
+    BCRYPT_ROUNDS = CONF_DICT['common'].get('BCRYPT_ROUNDS', 12)
+    BCRYPT_WORKERS = CONF_DICT['common'].get('BCRYPT_WORKERS', 2)
+    BCRYPT_QUEUE_SIZE = CONF_DICT['common'].get('BCRYPT_QUEUE_SIZE', 16)
+
+    ## gunicorn worker processes (each runs THREADS_PER_PAGE threads), keep-alive and shutdown (seconds)
+    WORKERS = CONF_DICT['common'].get('WORKERS', os.cpu_count() * 2 + 1)
+    KEEPALIVE = CONF_DICT['common'].get('KEEPALIVE', 5)
+    WORKER_TIMEOUT = CONF_DICT['common'].get('WORKER_TIMEOUT', 60)
+    GRACEFUL_TIMEOUT = CONF_DICT['common'].get('GRACEFUL_TIMEOUT', 30)
+
+    ## Requests after which a gunicorn worker is replaced, give or take up to the jitter
+    MAX_REQUESTS = CONF_DICT['common'].get('MAX_REQUESTS', 0)
+    MAX_REQUESTS_JITTER = CONF_DICT['common'].get('MAX_REQUESTS_JITTER', 0)
+
+    ## TLS certificate and key, relative to FlaskAPI (empty to serve plain HTTP behind a proxy)
+    CERT_FILE = CONF_DICT['common'].get('CERT_FILE', 'certs/cert.pem')
+    KEY_FILE = CONF_DICT['common'].get('KEY_FILE', 'certs/key.pem')
+
+    ## Statements slower than SLOW_QUERY_SECONDS are logged to SLOW_QUERY_LOG, or to stderr if empty (seconds, path)
+    SLOW_QUERY_SECONDS = CONF_DICT['common'].get('SLOW_QUERY_SECONDS', 1.0)
+    SLOW_QUERY_LOG = CONF_DICT['common'].get('SLOW_QUERY_LOG', '')
+
+    ## Request profiling: fraction of requests sampled, users allowed to ask with `X-Profile`, and the profiles kept
+    PROFILE_SAMPLE_RATE = CONF_DICT['common'].get('PROFILE_SAMPLE_RATE', 0.0)
+    PROFILE_USERS = CONF_DICT['common'].get('PROFILE_USERS', [])
+    PROFILE_INTERVAL = CONF_DICT['common'].get('PROFILE_INTERVAL', 0.001)
+    PROFILE_DIR = CONF_DICT['common'].get('PROFILE_DIR', 'profiles')
+    PROFILE_MAX_FILES = CONF_DICT['common'].get('PROFILE_MAX_FILES', 200)
+    PROFILE_MAX_MB = CONF_DICT['common'].get('PROFILE_MAX_MB', 50)
+
     ## Enable protection against *Cross-site Request Forgery (CSRF)*
     CSRF_ENABLED = CONF_DICT['common']['CSRF_ENABLED']
     CSRF_SESSION_KEY = CONF_DICT['common']['CSRF_SESSION_KEY']
@@ -60,6 +122,11 @@ class ProductionConfig(Config):
     DB_PASSWD = CONF_DICT['env']['production']['DATABASE_CONNECTION_OPTIONS']['DB_PASSWD']
     DB_NAME = CONF_DICT['env']['production']['DATABASE_CONNECTION_OPTIONS']['DB_NAME']
     CONNECT_TIMEOUT = CONF_DICT['env']['production']['DATABASE_CONNECTION_OPTIONS']['CONNECT_TIMEOUT']
+    DB_POOL_SIZE = CONF_DICT['env']['production']['DATABASE_CONNECTION_OPTIONS'].get('DB_POOL_SIZE', 5)
+    DB_POOL_MAX_OVERFLOW = CONF_DICT['env']['production']['DATABASE_CONNECTION_OPTIONS'].get('DB_POOL_MAX_OVERFLOW', 10)
+    DB_POOL_TIMEOUT = CONF_DICT['env']['production']['DATABASE_CONNECTION_OPTIONS'].get('DB_POOL_TIMEOUT', 30)
+    DB_POOL_RECYCLE = CONF_DICT['env']['production']['DATABASE_CONNECTION_OPTIONS'].get('DB_POOL_RECYCLE', 3600)
+    DB_POOL_PRE_PING = CONF_DICT['env']['production']['DATABASE_CONNECTION_OPTIONS'].get('DB_POOL_PRE_PING', True)
     PEPPER = CONF_DICT['env']['production']['DATABASE_CONNECTION_OPTIONS']['PEPPER']
     JWT_SECRET_KEY = CONF_DICT['env']['production']['DATABASE_CONNECTION_OPTIONS']['JWT_SECRET_KEY']
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=int(CONF_DICT['env']['production']['DATABASE_CONNECTION_OPTIONS']['JWT_ACCESS_TOKEN_EXPIRES']))
@@ -78,6 +145,11 @@ class DevelopmentConfig(Config):
     DB_PASSWD = CONF_DICT['env']['development']['DATABASE_CONNECTION_OPTIONS']['DB_PASSWD']
     DB_NAME = CONF_DICT['env']['development']['DATABASE_CONNECTION_OPTIONS']['DB_NAME']
     CONNECT_TIMEOUT = CONF_DICT['env']['development']['DATABASE_CONNECTION_OPTIONS']['CONNECT_TIMEOUT']
+    DB_POOL_SIZE = CONF_DICT['env']['development']['DATABASE_CONNECTION_OPTIONS'].get('DB_POOL_SIZE', 5)
+    DB_POOL_MAX_OVERFLOW = CONF_DICT['env']['development']['DATABASE_CONNECTION_OPTIONS'].get('DB_POOL_MAX_OVERFLOW', 10)
+    DB_POOL_TIMEOUT = CONF_DICT['env']['development']['DATABASE_CONNECTION_OPTIONS'].get('DB_POOL_TIMEOUT', 30)
+    DB_POOL_RECYCLE = CONF_DICT['env']['development']['DATABASE_CONNECTION_OPTIONS'].get('DB_POOL_RECYCLE', 3600)
+    DB_POOL_PRE_PING = CONF_DICT['env']['development']['DATABASE_CONNECTION_OPTIONS'].get('DB_POOL_PRE_PING', True)
     PEPPER = CONF_DICT['env']['development']['DATABASE_CONNECTION_OPTIONS']['PEPPER']
     JWT_SECRET_KEY = CONF_DICT['env']['development']['DATABASE_CONNECTION_OPTIONS']['JWT_SECRET_KEY']
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=int(CONF_DICT['env']['development']['DATABASE_CONNECTION_OPTIONS']['JWT_ACCESS_TOKEN_EXPIRES']))
\ No newline at end of file
@@ -0,0 +1,247 @@
+import heapq
+import bisect
+import threading
+import datetime
+from collections import defaultdict
+
+
+def to_seconds(value):
+    """Converts a TIME column (timedelta) or an "HH:MM[:SS]" string to seconds since midnight."""
+    if value is None:
+        return None
+    if isinstance(value, datetime.timedelta):
+        return int(value.total_seconds())
+    if isinstance(value, (int, float)):
+        return int(value)
+    parts = [int(part) for part in str(value).split(':')]
+    while len(parts) < 3:
+        parts.append(0)
+    return parts[0] * 3600 + parts[1] * 60 + parts[2]
+
+
+def build_index(rows, key_columns):
+    """Groups rows into {(weekday, key): [(start, end, row), ...]} sorted by start.
+
+    Rows missing any of the key columns or with an empty time span are left
+    out, since they cannot clash with anything.
+    """
+    index = defaultdict(list)
+    for row in rows:
+        key = tuple(row.get(column) for column in key_columns)
+        if any(part is None for part in key):
+            continue
+        start, end = to_seconds(row.get('StartTime')), to_seconds(row.get('EndTime'))
+        if start is None or end is None or end <= start:
+            continue
+        index[key].append((start, end, row))
+    for intervals in index.values():
+        intervals.sort(key=lambda interval: (interval[0], interval[1]))
+    return index
+
+
+def overlapping_pairs(intervals):
+    """Sweeps start-sorted intervals and yields every overlapping pair.
+
+    Intervals that only touch (one ends when the other starts) do not
+    overlap. Runs in O(n log n + k) for k reported pairs.
+    """
+    active = []  # heap of (end, position, interval)
+    for position, interval in enumerate(intervals):
+        start = interval[0]
+        while active and active[0][0] <= start:
+            heapq.heappop(active)
+        for _, _, other in active:
+            yield other, interval
+        heapq.heappush(active, (interval[1], position, interval))
+
+
+def crossing_pairs(intervals, blockers):
+    """Yields every (interval, blocker) pair that overlaps, both lists sorted by start."""
+    active_intervals, active_blockers = [], []
+    merged = heapq.merge(((i[0], 0, n, i) for n, i in enumerate(intervals)),
+                         ((b[0], 1, n, b) for n, b in enumerate(blockers)))
+    for start, kind, position, item in merged:
+        for active in (active_intervals, active_blockers):
+            while active and active[0][0] <= start:
+                heapq.heappop(active)
+        if kind == 0:
+            for _, _, blocker in active_blockers:
+                yield item, blocker
+            heapq.heappush(active_intervals, (item[1], position, item))
+        else:
+            for _, _, interval in active_intervals:
+                yield interval, item
+            heapq.heappush(active_blockers, (item[1], position, item))
+
+
+def _overlap(first, second):
+    return (datetime.timedelta(seconds=max(first[0], second[0])),
+            datetime.timedelta(seconds=min(first[1], second[1])))
+
+
+def find_conflicts(events, restrictions, occupations):
+    """Reports every clash between the given EVENT, RESTRICTION and OCCUPATION rows.
+
+    Returns room and lecturer double-bookings (pairs of events), events that
+    overlap a restriction of their lecturer and events that overlap an
+    occupation of their room.
+    """
+    events_by_room = build_index(events, ('WeekDay', 'RoomId'))
+    events_by_lecturer = build_index(events, ('WeekDay', 'LecturerId'))
+    restrictions_by_lecturer = build_index(restrictions, ('WeekDay', 'LecturerId'))
+    occupations_by_room = build_index(occupations, ('WeekDay', 'RoomId'))
+
+    conflicts = {
+        'room_double_bookings': [],
+        'lecturer_double_bookings': [],
+        'restriction_violations': [],
+        'occupation_conflicts': [],
+    }
+    for name, index, column in (('room_double_bookings', events_by_room, 'RoomId'),
+                                ('lecturer_double_bookings', events_by_lecturer, 'LecturerId')):
+        for (weekday, key), intervals in index.items():
+            for first, second in overlapping_pairs(intervals):
+                start, end = _overlap(first, second)
+                conflicts[name].append({
+                    'WeekDay': weekday, column: key,
+                    'EventIds': sorted((first[2]['Id'], second[2]['Id'])),
+                    'StartTime': start, 'EndTime': end,
+                })
+    for name, index, blockers_index, column, blocker_id in (
+            ('restriction_violations', events_by_lecturer, restrictions_by_lecturer, 'LecturerId', 'RestrictionId'),
+            ('occupation_conflicts', events_by_room, occupations_by_room, 'RoomId', 'OccupationId')):
+        for (weekday, key), blockers in blockers_index.items():
+            for event, blocker in crossing_pairs(index.get((weekday, key), []), blockers):
+                start, end = _overlap(event, blocker)
+                conflict = {
+                    'WeekDay': weekday, column: key,
+                    'EventId': event[2]['Id'], blocker_id: blocker[2]['Id'],
+                    'StartTime': start, 'EndTime': end,
+                }
+                if 'Type' in blocker[2]:
+                    conflict['Type'] = blocker[2]['Type']
+                conflicts[name].append(conflict)
+    return conflicts
+
+
+class ClashIndex:
+    """In-memory interval buckets of EVENT, RESTRICTION and OCCUPATION rows.
+
+    Unlike `find_conflicts`, which rebuilds everything, the index is loaded
+    once and then updated write by write, so checking one event only looks
+    at its own (weekday, room) and (weekday, lecturer) buckets. `seq` is the
+    CHANGE_LOG sequence number the index reflects every write up to; writes
+    made by other processes are read back from the log from there and
+    applied with `catch_up`.
+    """
+
+    TABLES = ('EVENT', 'RESTRICTION', 'OCCUPATION')
+    BUCKETS = {
+        'EVENT': (('events_by_room', ('WeekDay', 'RoomId')), ('events_by_lecturer', ('WeekDay', 'LecturerId'))),
+        'RESTRICTION': (('restrictions_by_lecturer', ('WeekDay', 'LecturerId')),),
+        'OCCUPATION': (('occupations_by_room', ('WeekDay', 'RoomId')),),
+    }
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.seq = None
+        self.__reset()
+
+    def __reset(self):
+        self.__buckets = {name: {} for buckets in self.BUCKETS.values() for name, _ in buckets}
+        self.__entries = {table: {} for table in self.TABLES}  # id -> [(bucket name, key, interval)]
+
+    def load(self, rows_by_table, seq):
+        """Replaces the whole index with `rows_by_table` ({table: rows}), read as of `seq`."""
+        with self.lock:
+            self.__reset()
+            for table, rows in rows_by_table.items():
+                for row in rows:
+                    self.__insert(table, row['Id'], row)
+            self.seq = seq
+
+    def apply(self, table, row_id, row, seq):
+        """Applies a committed write: `row` is the new row, or None when deleted.
+
+        `seq` is the sequence number the write was logged under. Writes to
+        other tables only move `seq` along. A write logged after one the
+        index has not seen is applied all the same, and `seq` stays behind so
+        that `catch_up` reads the missing ones.
+        """
+        with self.lock:
+            if self.seq is None or seq <= self.seq:
+                return
+            if table in self.TABLES and row_id is not None:
+                self.__set(table, row_id, row)
+            if seq == self.seq + 1:
+                self.seq = seq
+
+    def catch_up(self, changes, seq):
+        """Applies the (table, id, row) writes read back from CHANGE_LOG up to `seq`."""
+        with self.lock:
+            for table, row_id, row in changes:
+                self.__set(table, row_id, row)
+            self.seq = max(self.seq, seq)
+
+    def check_event(self, row, exclude_id=None):
+        """Returns the ids clashing with an event, per kind of clash.
+
+        `exclude_id` is the event's own id when it is being updated.
+        """
+        with self.lock:
+            clashes = {}
+            for kind, name, column in (('room', 'events_by_room', 'RoomId'),
+                                       ('lecturer', 'events_by_lecturer', 'LecturerId'),
+                                       ('restrictions', 'restrictions_by_lecturer', 'LecturerId'),
+                                       ('occupations', 'occupations_by_room', 'RoomId')):
+                key, interval = self.__interval(row, ('WeekDay', column), None)
+                if key is None:
+                    continue
+                ids = [other[2] for other in self.__overlapping(self.__buckets[name].get(key, ()), interval)
+                       if other[2] != exclude_id]
+                if ids:
+                    clashes[kind] = ids
+            return clashes
+
+    @staticmethod
+    def __interval(row, columns, row_id):
+        try:
+            key = tuple(int(row[column]) for column in columns)
+            start, end = to_seconds(row['StartTime']), to_seconds(row['EndTime'])
+        except (KeyError, TypeError, ValueError):
+            return None, None
+        if start is None or end is None or end <= start:
+            return None, None
+        return key, (start, end, row_id)
+
+    @staticmethod
+    def __overlapping(bucket, interval):
+        start, end = interval[0], interval[1]
+        for other in bucket:
+            if other[0] >= end:
+                # Sorted by start, so nothing further can overlap
+                break
+            if other[1] > start:
+                yield other
+
+    def __set(self, table, row_id, row):
+        self.__remove(table, row_id)
+        if row is not None:
+            self.__insert(table, row_id, row)
+
+    def __insert(self, table, row_id, row):
+        entries = []
+        for name, columns in self.BUCKETS[table]:
+            key, interval = self.__interval(row, columns, row_id)
+            if key is None:
+                continue
+            bisect.insort(self.__buckets[name].setdefault(key, []), interval)
+            entries.append((name, key, interval))
+        self.__entries[table][row_id] = entries
+
+    def __remove(self, table, row_id):
+        for name, key, interval in self.__entries[table].pop(row_id, ()):
+            bucket = self.__buckets[name][key]
+            bucket.remove(interval)
+            if not bucket:
+                del self.__buckets[name][key]
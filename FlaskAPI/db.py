@@ -1,51 +1,264 @@
+import time
+import threading
+from contextlib import contextmanager
+from collections import deque
+
 import pymysql
+import pymysql.cursors
+
+import metrics
+
+
+class PoolTimeoutError(pymysql.MySQLError):
+    """Raised when no connection could be checked out of the pool in time."""
+
+
+class ConnectionPool:
+    """Thread-safe, bounded pool of MySQL connections.
+
+    Up to `size` connections are kept idle between checkouts, up to
+    `max_overflow` extra connections may be opened under load (they are closed
+    once returned), and checkouts block for at most `timeout` seconds.
+    Connections older than `recycle` seconds are replaced, and idle
+    connections are pinged before being handed out when `pre_ping` is set.
+    """
+
+    def __init__(self, creator, size=5, max_overflow=10, timeout=30,
+                 recycle=3600, pre_ping=True):
+        self.__creator = creator
+        self.__size = size
+        self.__max_overflow = max_overflow
+        self.__timeout = timeout
+        self.__recycle = recycle
+        self.__pre_ping = pre_ping
+        self.__cond = threading.Condition()
+        self.__idle = deque()       # (connection, created_at)
+        self.__created_at = {}      # id(connection) -> created_at
+        self.__checked_out = 0
+        self.__checkouts = 0
+        self.__timeouts = 0
+        self.__wait_total = 0.0
+        self.__wait_max = 0.0
+
+    def __new_connection(self):
+        conn = self.__creator()
+        self.__created_at[id(conn)] = time.monotonic()
+        return conn
+
+    def __discard(self, conn):
+        self.__created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def __is_usable(self, conn):
+        """Applies the recycle and pre-ping policies to an idle connection."""
+        created_at = self.__created_at.get(id(conn), 0)
+        if self.__recycle is not None and self.__recycle >= 0 \
+                and time.monotonic() - created_at > self.__recycle:
+            return False
+        if self.__pre_ping:
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                return False
+        return True
+
+    def acquire(self):
+        """Checks out a connection, blocking up to the configured timeout."""
+        start = time.monotonic()
+        deadline = start + self.__timeout
+        with self.__cond:
+            while not self.__idle and \
+                    self.__checked_out >= self.__size + self.__max_overflow:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.__timeouts += 1
+                    raise PoolTimeoutError(
+                        f'No database connection available after {self.__timeout}s')
+                self.__cond.wait(remaining)
+            conn = self.__idle.pop()[0] if self.__idle else None
+            self.__checked_out += 1
+
+        try:
+            if conn is not None and not self.__is_usable(conn):
+                self.__discard(conn)
+                conn = None
+            if conn is None:
+                conn = self.__new_connection()
+        except Exception:
+            with self.__cond:
+                self.__checked_out -= 1
+                self.__cond.notify()
+            raise
+
+        waited = time.monotonic() - start
+        with self.__cond:
+            self.__checkouts += 1
+            self.__wait_total += waited
+            self.__wait_max = max(self.__wait_max, waited)
+        return conn
+
+    def release(self, conn, discard=False):
+        """Returns a connection to the pool, ending any open transaction."""
+        if not discard:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+        with self.__cond:
+            self.__checked_out -= 1
+            if discard or len(self.__idle) >= self.__size:
+                self.__discard(conn)
+            else:
+                self.__idle.append((conn, self.__created_at.get(id(conn), 0)))
+            self.__cond.notify()
+
+    def prefill(self):
+        """Opens connections until `size` of them are idle."""
+        while True:
+            with self.__cond:
+                if len(self.__idle) + self.__checked_out >= self.__size:
+                    return
+                self.__checked_out += 1
+            try:
+                conn = self.__new_connection()
+            except Exception:
+                with self.__cond:
+                    self.__checked_out -= 1
+                    self.__cond.notify()
+                raise
+            with self.__cond:
+                self.__checked_out -= 1
+                self.__idle.append((conn, self.__created_at[id(conn)]))
+                self.__cond.notify()
+
+    def dispose(self):
+        """Closes every idle connection."""
+        with self.__cond:
+            while self.__idle:
+                self.__discard(self.__idle.pop()[0])
+
+    def stats(self):
+        """Returns a snapshot of the pool usage."""
+        with self.__cond:
+            return {
+                'size': self.__size,
+                'max_overflow': self.__max_overflow,
+                'in_use': self.__checked_out,
+                'idle': len(self.__idle),
+                'checkouts': self.__checkouts,
+                'timeouts': self.__timeouts,
+                'wait_time_total': round(self.__wait_total, 6),
+                'wait_time_avg': round(self.__wait_total / self.__checkouts, 6) if self.__checkouts else 0.0,
+                'wait_time_max': round(self.__wait_max, 6),
+            }
+
+
+class _TimedCursorMixin:
+    """Times every statement into the query metrics and the slow query log."""
+
+    def execute(self, query, args=None):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = super().execute(query, args)
+            failed = False
+            return result
+        finally:
+            # Unbuffered cursors only know their row count once read
+            rows = None if failed or self._unbuffered else self.rowcount
+            metrics.observe_query(query, args, time.perf_counter() - started, rows, failed)
+
+
+class TimedCursor(_TimedCursorMixin, pymysql.cursors.Cursor):
+    _unbuffered = False
+
+
+class TimedSSCursor(_TimedCursorMixin, pymysql.cursors.SSCursor):
+    _unbuffered = True
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(config):
+    """Returns the process-wide connection pool for the given configuration."""
+    with _pools_lock:
+        pool = _pools.get(config)
+        if pool is None:
+            def creator():
+                return pymysql.connect(
+                    host=config.DB_HOST,
+                    port=int(config.DB_PORT),
+                    user=config.DB_USER,
+                    passwd=config.DB_PASSWD,
+                    db=config.DB_NAME,
+                    connect_timeout=config.CONNECT_TIMEOUT,
+                    cursorclass=TimedCursor
+                )
+            pool = ConnectionPool(
+                creator,
+                size=getattr(config, 'DB_POOL_SIZE', 5),
+                max_overflow=getattr(config, 'DB_POOL_MAX_OVERFLOW', 10),
+                timeout=getattr(config, 'DB_POOL_TIMEOUT', 30),
+                recycle=getattr(config, 'DB_POOL_RECYCLE', 3600),
+                pre_ping=getattr(config, 'DB_POOL_PRE_PING', True)
+            )
+            _pools[config] = pool
+        return pool
 
 
 class Database:
-    """Database connection class."""
+    """Database connection class.
+
+    The connection is checked out of the shared pool on first use and given
+    back by `close_connection()`.
+    """
 
     def __init__(self, config):
-        self.__host = config.DB_HOST
-        self.__username = config.DB_USER
-        self.__password = config.DB_PASSWD
-        self.__port = int(config.DB_PORT)
-        self.__dbname = config.DB_NAME
-        self.__connect_timeout = config.CONNECT_TIMEOUT
+        self.__pool = get_pool(config)
         self.__conn = None
-        self.__open_connection()
+        self.__in_transaction = False
 
     def __del__(self):
         self.close_connection()
 
     def __open_connection(self):
-        """Connect to MySQL Database."""
+        """Check out a connection to the MySQL Database."""
         try:
             if self.__conn is None:
-                self.__conn = pymysql.connect(
-                    host=self.__host,
-                    port=self.__port,
-                    user=self.__username,
-                    passwd=self.__password,
-                    db=self.__dbname,
-                    connect_timeout=self.__connect_timeout
-                )
+                started = time.perf_counter()
+                self.__conn = self.__pool.acquire()
+                metrics.observe_acquire(time.perf_counter() - started)
         except pymysql.MySQLError as sqle:
             raise pymysql.MySQLError(
-                f'Failed to connect to the database due to: {sqle}')
+                f'Failed to connect to the database due to: {sqle}') from sqle
         except Exception as e:
-            raise Exception(f'An exception occured due to: {e}')
+            raise Exception(f'An exception occured due to: {e}') from e
 
     @property
     def db_connection_status(self):
         """Returns the connection status"""
+        try:
+            self.__open_connection()
+        except Exception:
+            return False
         return True if self.__conn is not None else False
 
+    @property
+    def pool_stats(self):
+        """Returns the statistics of the underlying connection pool."""
+        return self.__pool.stats()
+
     def close_connection(self):
-        """Close the DB connection."""
+        """Return the DB connection to the pool."""
         try:
             if self.__conn is not None:
-                self.__conn.close()
-                self.__conn = None
+                conn, self.__conn = self.__conn, None
+                self.__pool.release(conn, discard=not conn.open)
         except Exception as e:
             raise Exception(
                 f'Failed to close the database connection due to: {e}')
@@ -71,7 +284,8 @@ class Database:
                         json_data.append(dict(zip(row_headers, result)))
                     result = json_data
                 else:
-                    self.__conn.commit()
+                    if not self.__in_transaction:
+                        self.__conn.commit()
                     if 'INSERT' in query.upper():
                         result = {"id": cursor.lastrowid}
                     else:
@@ -80,9 +294,81 @@ class Database:
 
                 return result
         except pymysql.MySQLError as sqle:
-            raise pymysql.MySQLError(f'Failed to execute query due to: {sqle}')
+            raise pymysql.MySQLError(f'Failed to execute query due to: {sqle}') from sqle
+        except Exception as e:
+            raise Exception(f'An exception occured due to: {e}') from e
+
+    @contextmanager
+    def transaction(self, read_only=False, consistent_snapshot=False):
+        """Runs the enclosed queries in a single transaction.
+
+        `run_query` does not commit inside the block; the transaction is
+        committed when the block exits and rolled back if it raises.
+        """
+        if self.__in_transaction:
+            raise Exception('A transaction is already in progress')
+        options = []
+        if consistent_snapshot:
+            options.append('WITH CONSISTENT SNAPSHOT')
+        options.append('READ ONLY' if read_only else 'READ WRITE')
+        try:
+            if not self.__conn:
+                self.__open_connection()
+            with self.__conn.cursor() as cursor:
+                cursor.execute(f"START TRANSACTION {', '.join(options)}")
+        except pymysql.MySQLError as sqle:
+            raise pymysql.MySQLError(f'Failed to start transaction due to: {sqle}')
+        self.__in_transaction = True
+        try:
+            yield self
+            self.__conn.commit()
+        except BaseException:
+            self.__conn.rollback()
+            raise
+        finally:
+            self.__in_transaction = False
+
+    def stream_query(self, query, args=tuple(), batch_size=1000):
+        """Execute a SELECT query on an unbuffered server-side cursor.
+
+        The query runs eagerly, so errors surface here, but rows are only
+        read from the server as the returned iterator is consumed. The
+        connection cannot run other queries until the iterator is exhausted
+        or closed.
+        """
+        try:
+            if not query or not isinstance(query, str):
+                raise Exception()
+
+            if not self.__conn:
+                self.__open_connection()
+            cursor = self.__conn.cursor(TimedSSCursor)
+            try:
+                cursor.execute(query, args)
+            except Exception:
+                cursor.close()
+                raise
+        except pymysql.MySQLError as sqle:
+            raise pymysql.MySQLError(f'Failed to execute query due to: {sqle}') from sqle
         except Exception as e:
-            raise Exception(f'An exception occured due to: {e}')
+            raise Exception(f'An exception occured due to: {e}') from e
+        return self.__iter_rows(cursor, query, batch_size)
+
+    @staticmethod
+    def __iter_rows(cursor, query, batch_size):
+        count = 0
+        try:
+            row_headers = [x[0] for x in cursor.description]
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                count += len(rows)
+                for row in rows:
+                    yield dict(zip(row_headers, row))
+            metrics.observe_rows(query, count)
+        finally:
+            cursor.close()
 
     def get_connection(self):
         """Returns the connection object."""
@@ -0,0 +1,79 @@
+"""
+gunicorn settings for running the API in production. From the FlaskAPI folder:
+
+    gunicorn app:app
+
+runs WORKERS pre-forked processes of THREADS_PER_PAGE threads each, with the
+TLS certificate and the keep-alive from settings.json. `kill -HUP` on the
+master reloads settings.json and the code: new workers are started and the
+old ones finish their in-flight requests (up to GRACEFUL_TIMEOUT seconds)
+before exiting, while the listening socket stays open.
+"""
+import os
+import sys
+import shutil
+import tempfile
+import importlib
+
+# gunicorn runs this file again on every HUP, so re-read settings.json too
+if 'config' in sys.modules:
+    importlib.reload(sys.modules['config'])
+from config import ProductionConfig as conf
+
+# The table versions live in shared memory that must be created before the
+# workers are forked. Creating them here, in the master, also keeps them
+# across reloads, so the ETags handed out by the old workers remain valid.
+import versions  # noqa: F401
+
+# The workers write their metrics to files in this folder, which /metrics adds up
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), f'schedule-backend-metrics-{os.getpid()}'))
+
+bind = f"{os.environ.get('FLASK_SERVER_HOST', conf.HOST)}:{os.environ.get('FLASK_SERVER_PORT', conf.PORT)}"
+workers = conf.WORKERS
+worker_class = 'gthread'
+threads = conf.THREADS_PER_PAGE
+keepalive = conf.KEEPALIVE
+timeout = conf.WORKER_TIMEOUT
+graceful_timeout = conf.GRACEFUL_TIMEOUT
+max_requests = conf.MAX_REQUESTS
+max_requests_jitter = conf.MAX_REQUESTS_JITTER
+
+if conf.CERT_FILE:
+    certfile = os.path.join(conf.BASE_DIR, conf.CERT_FILE)
+    keyfile = os.path.join(conf.BASE_DIR, conf.KEY_FILE)
+
+# Each worker imports the app itself, so a reload picks up code changes
+preload_app = False
+
+
+def on_starting(server):
+    # Samples left by a previous run would be added to this one's
+    directory = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def on_exit(server):
+    shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+
+
+def post_worker_init(worker):
+    # Runs in the worker once the app is imported, before it accepts connections
+    from app import warm_up
+    try:
+        warm_up()
+    except Exception as e:
+        # The database may be briefly unavailable; the first requests load what is missing
+        worker.log.warning("Warm-up failed: %s", e)
+
+
+def worker_exit(server, worker):
+    app = sys.modules.get('app')
+    if app is not None:
+        app.password_hasher.shutdown()
+        app.get_pool(app.conf).dispose()
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
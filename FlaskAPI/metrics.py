@@ -0,0 +1,123 @@
+import os
+import re
+import logging
+import functools
+from flask import has_request_context, request
+from prometheus_client import Counter, Histogram, CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client import multiprocess
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+BYTE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+PASSWORD_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUEST_LATENCY = Histogram('api_request_duration_seconds', "Time to answer a request",
+                            ['route', 'method', 'status'], buckets=LATENCY_BUCKETS)
+RESPONSE_BYTES = Histogram('api_response_bytes', "Size of the response bodies as sent",
+                           ['route', 'method'], buckets=BYTE_BUCKETS)
+QUERY_LATENCY = Histogram('db_query_duration_seconds', "Time to run a SQL statement",
+                          ['route', 'statement'], buckets=LATENCY_BUCKETS)
+QUERY_ROWS = Histogram('db_query_rows', "Rows returned or changed by a SQL statement",
+                       ['route', 'statement'], buckets=ROW_BUCKETS)
+QUERY_ERRORS = Counter('db_query_errors', "SQL statements that raised an error",
+                       ['route', 'statement'])
+ACQUIRE_LATENCY = Histogram('db_pool_acquire_seconds', "Time to check a connection out of the pool",
+                            ['route'], buckets=LATENCY_BUCKETS)
+PASSWORD_LATENCY = Histogram('password_hash_duration_seconds', "Time to hash or check a password, queueing included",
+                             ['operation'], buckets=PASSWORD_BUCKETS)
+PASSWORD_REJECTED = Counter('password_hash_rejected', "Password hashes refused because the hasher was saturated",
+                            ['operation'])
+
+slow_query_log = logging.getLogger('slow_queries')
+slow_query_seconds = None
+
+_SPACES = re.compile(r'\s+')
+_LITERALS = re.compile(r"'(?:[^'\\]|\\.)*'|%s|%\(\w+\)s|\b\d+(?:\.\d+)?\b")
+_FIELD_LIST = re.compile(r"^SELECT (?=[^`]*`).*? FROM ", re.IGNORECASE)
+_VALUE_LIST = re.compile(r"\(\?(?:, ?\?)*\)")
+_ROW_LIST = re.compile(r"\(\.\.\.\)(?:, ?\(\.\.\.\))+")
+
+
+def configure(slow_query_seconds=None, slow_query_path=None):
+    """Logs statements slower than `slow_query_seconds` to `slow_query_path`, or to stderr."""
+    globals()['slow_query_seconds'] = slow_query_seconds
+    slow_query_log.handlers.clear()
+    handler = logging.FileHandler(slow_query_path) if slow_query_path else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s [%(process)d] %(message)s'))
+    slow_query_log.addHandler(handler)
+    slow_query_log.setLevel(logging.WARNING)
+    slow_query_log.propagate = False
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize(query):
+    """Reduces a SQL statement to its shape, to be used as a metric label.
+
+    Literals and placeholders become `?`, `IN`/`VALUES` lists become
+    `(...)` and `?fields=` column lists become `...`, so the label set stays
+    small whatever the arguments.
+    """
+    statement = _SPACES.sub(' ', query).strip()
+    statement = _LITERALS.sub('?', statement)
+    statement = _FIELD_LIST.sub('SELECT ... FROM ', statement)
+    statement = _VALUE_LIST.sub('(...)', statement)
+    statement = _ROW_LIST.sub('(...)', statement)
+    return statement[:200]
+
+
+def current_route():
+    """The URL rule of the request being served, e.g. `/api/v1/events/<int:id>`."""
+    if not has_request_context():
+        return 'background'
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def observe_query(query, args, elapsed, rows, failed=False):
+    route = current_route()
+    statement = normalize(query)
+    QUERY_LATENCY.labels(route, statement).observe(elapsed)
+    if failed:
+        QUERY_ERRORS.labels(route, statement).inc()
+    elif rows is not None:
+        QUERY_ROWS.labels(route, statement).observe(rows)
+    if slow_query_seconds is not None and elapsed >= slow_query_seconds:
+        slow_query_log.warning("%.3fs route=%s statement=%s params=%.1000r",
+                               elapsed, route, _SPACES.sub(' ', query).strip()[:2000], args)
+
+
+def observe_rows(query, rows):
+    QUERY_ROWS.labels(current_route(), normalize(query)).observe(rows)
+
+
+def observe_acquire(elapsed):
+    ACQUIRE_LATENCY.labels(current_route()).observe(elapsed)
+
+
+def observe_password(operation, elapsed):
+    PASSWORD_LATENCY.labels(operation).observe(elapsed)
+
+
+def observe_password_rejected(operation):
+    PASSWORD_REJECTED.labels(operation).inc()
+
+
+def observe_request(method, status, elapsed, size):
+    route = current_route()
+    REQUEST_LATENCY.labels(route, method, status).observe(elapsed)
+    if size is not None:
+        RESPONSE_BYTES.labels(route, method).observe(size)
+
+
+def render():
+    """Returns the metrics in the Prometheus text format, and its content type.
+
+    Under gunicorn the workers write their samples to
+    PROMETHEUS_MULTIPROC_DIR, and they are added up here.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,122 @@
+import math
+import time
+import threading
+import multiprocessing
+import bcrypt
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+
+
+class HasherBusyError(Exception):
+    """Raised when every worker is busy and the queue is full.
+
+    `retry_after` is a guess, in seconds, of when a slot frees up.
+    """
+
+    def __init__(self, retry_after):
+        super().__init__("Too many logins in progress")
+        self.retry_after = retry_after
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+
+def _context():
+    # fork would copy the locks held by the server's other threads into the workers
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+class PasswordHasher:
+    """Runs bcrypt in a pool of worker processes instead of the request thread.
+
+    At most `workers` hashes run at once and `queue_size` more wait for a
+    worker. Any further request fails right away with `HasherBusyError`, so
+    a burst of logins cannot tie up every request thread. The pool is only
+    started on first use, so each server process gets its own. Its workers
+    are started from a fork server rather than forked from the server
+    process, whose other threads may hold locks at that moment.
+    """
+
+    def __init__(self, workers=2, queue_size=16, rounds=12, timeout=30):
+        self.rounds = rounds
+        self.__workers = workers
+        self.__timeout = timeout
+        self.__slots = threading.BoundedSemaphore(workers + queue_size)
+        self.__executor = None
+        self.__lock = threading.Lock()
+        self.__in_flight = 0
+        self.__count = 0
+        self.__rejected = 0
+        self.__time_total = 0.0
+        self.__time_max = 0.0
+
+    def hash(self, password):
+        """Returns the bcrypt hash of `password` (bytes), using `rounds`."""
+        return self.__run('hash', _hash, password, self.rounds)
+
+    def check(self, password, hashed):
+        """Whether `password` (bytes) matches a stored bcrypt hash."""
+        return self.__run('check', _check, password, hashed)
+
+    def __run(self, operation, function, *args):
+        if not self.__slots.acquire(blocking=False):
+            with self.__lock:
+                self.__rejected += 1
+            metrics.observe_password_rejected(operation)
+            raise HasherBusyError(self.__retry_after())
+        started = time.monotonic()
+        try:
+            with self.__lock:
+                self.__in_flight += 1
+                if self.__executor is None:
+                    self.__executor = ProcessPoolExecutor(max_workers=self.__workers, mp_context=_context())
+                executor = self.__executor
+            return executor.submit(function, *args).result(timeout=self.__timeout)
+        except BrokenProcessPool:
+            # A worker died; start a new pool for the next request
+            with self.__lock:
+                if self.__executor is executor:
+                    self.__executor = None
+            raise
+        finally:
+            elapsed = time.monotonic() - started
+            with self.__lock:
+                self.__in_flight -= 1
+                self.__count += 1
+                self.__time_total += elapsed
+                self.__time_max = max(self.__time_max, elapsed)
+            metrics.observe_password(operation, elapsed)
+            self.__slots.release()
+
+    def __retry_after(self):
+        with self.__lock:
+            average = self.__time_total / self.__count if self.__count else 1.0
+            return max(1, math.ceil(average * self.__in_flight / self.__workers))
+
+    def shutdown(self):
+        with self.__lock:
+            if self.__executor is not None:
+                self.__executor.shutdown(wait=False)
+                self.__executor = None
+
+    def stats(self):
+        """Returns a snapshot of the hashing load and latency (seconds, queueing included)."""
+        with self.__lock:
+            return {
+                'rounds': self.rounds,
+                'workers': self.__workers,
+                'in_flight': self.__in_flight,
+                'hashes': self.__count,
+                'rejected': self.__rejected,
+                'time_avg': round(self.__time_total / self.__count, 4) if self.__count else 0.0,
+                'time_max': round(self.__time_max, 4),
+            }
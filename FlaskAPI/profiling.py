@@ -0,0 +1,147 @@
+import os
+import re
+import sys
+import time
+import threading
+from collections import Counter
+
+
+# Where a sample is counted, from the innermost frame matching one of these
+_DB_FILES = (f'{os.sep}pymysql{os.sep}',)
+_DB_FUNCTIONS = (('db.py', 'acquire'),)  # waiting for a pooled connection
+_SERIALIZATION_FILES = ('json_provider.py', f'{os.sep}json{os.sep}', 'compression.py', 'gzip.py')
+_UNSAFE = re.compile(r'[^A-Za-z0-9_.-]+')
+
+
+def _category(frame):
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if any(part in filename for part in _DB_FILES) or \
+                (os.path.basename(filename), frame.f_code.co_name) in _DB_FUNCTIONS:
+            return 'db'
+        if any(part in filename for part in _SERIALIZATION_FILES):
+            return 'serialization'
+        frame = frame.f_back
+    return 'python'
+
+
+def _fold(frame):
+    """The `root;...;leaf` line of a stack, as read by flamegraph.pl and speedscope."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names)).replace(' ', '_')
+
+
+class Profile:
+    """Samples of one request, taken on the thread serving it."""
+
+    def __init__(self, label):
+        self.label = label
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self.categories = Counter()
+        self.started = time.perf_counter()
+        self.cpu_started = time.thread_time()
+        self.wall = None
+        self.cpu = None
+
+    def add(self, frame):
+        self.stacks[_fold(frame)] += 1
+        self.categories[_category(frame)] += 1
+
+    def timings(self):
+        """Splits the wall-clock time (seconds) by where the samples were taken."""
+        total = sum(self.categories.values())
+        split = {category: self.wall * self.categories[category] / total if total else 0.0
+                 for category in ('db', 'serialization', 'python')}
+        split.update(cpu=self.cpu, total=self.wall)
+        return split
+
+
+class RequestProfiler:
+    """Wall-clock sampling profiler for individual requests.
+
+    While at least one request is being profiled, a background thread
+    samples the stack of each profiled request's thread every `interval`
+    seconds. A finished profile is written to `directory` as folded stacks,
+    one file per request, and the oldest files are deleted so that at most
+    `max_files` files and `max_bytes` bytes are kept.
+    """
+
+    def __init__(self, directory, interval=0.001, max_files=200, max_bytes=50 * 1024 * 1024):
+        self.__directory = directory
+        self.__interval = interval
+        self.__max_files = max_files
+        self.__max_bytes = max_bytes
+        self.__active = {}
+        self.__lock = threading.Lock()
+        self.__thread = None
+        self.__count = 0
+
+    def start(self, label):
+        """Starts profiling the calling thread."""
+        profile = Profile(label)
+        with self.__lock:
+            self.__active[profile.thread_id] = profile
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, name='request-profiler', daemon=True)
+                self.__thread.start()
+        return profile
+
+    def stop(self, profile, save=True):
+        """Stops profiling and returns the name of the file written, if any."""
+        with self.__lock:
+            if self.__active.get(profile.thread_id) is not profile:
+                return None
+            del self.__active[profile.thread_id]
+            self.__count += 1
+            number = self.__count
+        profile.wall = time.perf_counter() - profile.started
+        profile.cpu = time.thread_time() - profile.cpu_started
+        if not save or not profile.stacks:
+            return None
+        name = (f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{number}-"
+                f"{_UNSAFE.sub('_', profile.label).strip('_')[:80]}-{round(profile.wall * 1000)}ms.folded")
+        os.makedirs(self.__directory, exist_ok=True)
+        with open(os.path.join(self.__directory, name), 'w') as profile_file:
+            for stack, count in profile.stacks.most_common():
+                profile_file.write(f"{stack} {count}\n")
+        self.__prune()
+        return name
+
+    def __run(self):
+        while True:
+            with self.__lock:
+                if not self.__active:
+                    self.__thread = None
+                    return
+                frames = sys._current_frames()
+                for thread_id, profile in self.__active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        profile.add(frame)
+            del frames
+            time.sleep(self.__interval)
+
+    def __prune(self):
+        # Other worker processes write to the same folder, so files may vanish meanwhile
+        files = []
+        for name in os.listdir(self.__directory):
+            if name.endswith('.folded'):
+                try:
+                    info = os.stat(os.path.join(self.__directory, name))
+                except FileNotFoundError:
+                    continue
+                files.append((info.st_mtime, name, info.st_size))
+        files.sort(reverse=True)
+        kept_bytes = 0
+        for position, (_, name, size) in enumerate(files):
+            kept_bytes += size
+            if position >= self.__max_files or kept_bytes > self.__max_bytes:
+                try:
+                    os.remove(os.path.join(self.__directory, name))
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,58 @@
+import os
+import re
+
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Database', 'schedule.sql')
+
+_CREATE_TABLE = re.compile(r"CREATE TABLE `(\w+)` \((.*?)\n\);", re.S)
+_COLUMN = re.compile(r"^\s*`(\w+)`")
+
+
+def load_columns(_sql_filepath = SCHEMA_FILE):
+    """Returns {table: [column, ...]} as declared in the schema script."""
+    try:
+        with open(_sql_filepath) as sql_file:
+            sql = sql_file.read()
+    except Exception as e:
+        raise Exception(f'Failed to load {_sql_filepath} due to: {e}')
+
+    tables = {}
+    for table, body in _CREATE_TABLE.findall(sql):
+        tables[table] = [m.group(1) for m in map(_COLUMN.match, body.split('\n')) if m]
+    return tables
+
+
+TABLE_COLUMNS = load_columns()
+
+## Collections exposed by the API and the table behind each of them
+COLLECTIONS = {
+    'events': 'EVENT',
+    'rooms': 'ROOM',
+    'lecturers': 'LECTURER',
+    'blocks': 'BLOCK',
+    'restrictions': 'RESTRICTION',
+    'occupations': 'OCCUPATION',
+}
+
+
+def parse_fields(table, fields, extra=()):
+    """Validates a comma separated `fields` projection against the table's columns.
+
+    Returns the requested column names in order, or every column when `fields`
+    is empty. Names in `extra` are computed fields that may also be requested.
+    """
+    columns = TABLE_COLUMNS[table]
+    if not fields:
+        return columns + list(extra)
+    selected = []
+    for field in fields.split(','):
+        field = field.strip()
+        if not field:
+            continue
+        if field not in columns and field not in extra:
+            raise ValueError(f"Unknown field '{field}' for {table}")
+        if field not in selected:
+            selected.append(field)
+    if not selected:
+        raise ValueError("No fields selected")
+    return selected
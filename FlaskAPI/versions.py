@@ -0,0 +1,55 @@
+import os
+import zlib
+import multiprocessing
+
+
+TABLES = ('EVENT', 'ROOM', 'LECTURER', 'BLOCK', 'BLOCK_TO_EVENT', 'RESTRICTION', 'OCCUPATION')
+
+
+class TableVersions:
+    """Per-table write counters.
+
+    The counters live in shared memory, so worker processes forked after this
+    object was created see each other's bumps. The epoch changes on every
+    start, so tags handed out before a restart never match again. `seq` is
+    the highest CHANGE_LOG sequence number committed by any of the processes.
+    """
+
+    def __init__(self, tables=TABLES):
+        self.__index = {table: i for i, table in enumerate(tables)}
+        self.__counters = multiprocessing.RawArray('Q', len(tables))
+        self.__seq = multiprocessing.RawValue('Q', 0)
+        self.__lock = multiprocessing.Lock()
+        self.epoch = os.urandom(4).hex()
+
+    def bump(self, *tables, seq=None):
+        """Marks the given tables as changed and returns their new versions.
+
+        `seq` is the sequence number the write was logged under.
+        """
+        with self.__lock:
+            for table in tables:
+                self.__counters[self.__index[table]] += 1
+            if seq is not None and seq > self.__seq.value:
+                self.__seq.value = seq
+            return {table: self.__counters[self.__index[table]] for table in tables}
+
+    @property
+    def seq(self):
+        return self.__seq.value
+
+    def get(self, table):
+        """Returns the current version of a table."""
+        return self.__counters[self.__index[table]]
+
+    def etag(self, tables, variant=b''):
+        """Returns a tag that changes whenever one of the tables does.
+
+        `variant` tells apart representations of the same tables, such as
+        different query strings.
+        """
+        stamp = '.'.join(str(self.get(table)) for table in tables)
+        return f"{self.epoch}-{stamp}-{zlib.crc32(variant):08x}"
+
+
+table_versions = TableVersions()
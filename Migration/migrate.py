@@ -2,6 +2,7 @@
 This script migrates the data from the old database to the new database. It reads the old DB data (stored in the old_db folder in CSV format), converts it to the new format and writes it to the new database. The data is also written to CSV files in the new_db folder.
 """
 import sys
+import time
 import pandas as pd
 import os
 from dotenv import load_dotenv
@@ -9,6 +10,9 @@ import mysql.connector
 from time_converter import convertTime
 import numpy as np
 import traceback
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # Load environment variables from .env file
 load_dotenv()
@@ -24,11 +28,38 @@ db_config = {
     'database': os.getenv('DB_NAME'),
 }
 
-connection = mysql.connector.connect(**db_config)
-cursor = connection.cursor()
+# Rows sent per executemany, which mysql.connector turns into one multi-row INSERT
+chunk_size = int(os.getenv('MIGRATION_CHUNK_SIZE', 1000))
 
+# Tables loaded at the same time, each over its own connection
+workers = int(os.getenv('MIGRATION_WORKERS', 3))
 
-def migrateRooms(cursor):
+# The load order is taken from the foreign keys declared here
+schema_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Database", "schedule.sql")
+
+
+def bulkInsert(connection, table, insert_query, df, columns):
+    """
+    Inserts the given columns of every row of df into table in chunks of chunk_size rows. The table is loaded in a single transaction, committed at the end, and the rows per second are printed.
+    """
+    # astype(object) turns NumPy scalars into the Python values the connector expects
+    rows = list(df[columns].astype(object).itertuples(index=False, name=None))
+    start = time.perf_counter()
+    cursor = connection.cursor()
+    try:
+        for first in range(0, len(rows), chunk_size):
+            cursor.executemany(insert_query, rows[first:first + chunk_size])
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+    elapsed = time.perf_counter() - start
+    print(f"{table}: {len(rows)} rows in {elapsed:.2f}s ({len(rows) / elapsed if elapsed else 0:.0f} rows/s)")
+
+
+def migrateRooms(connection):
     input_file = old_db_folder + "Salas.csv"
     output_file = new_db_folder + "Rooms.csv"
 
@@ -47,14 +78,10 @@ def migrateRooms(cursor):
     VALUES (%s, %s, %s, %s, %s, %s);
     '''
 
-    for index, row in df.iterrows():
-        values = (row['Id'], row['NameAbbr'], row['Name'],
-                  row['Number'], row['Capacity'], row['Hide'])
-        cursor.execute(insert_query, values)
-        connection.commit()
+    bulkInsert(connection, 'ROOM', insert_query, df, ['Id', 'NameAbbr', 'Name', 'Number', 'Capacity', 'Hide'])
 
 
-def migrateLecturers(cursor):
+def migrateLecturers(connection):
     input_file = old_db_folder + "Docentes.csv"
     output_file = new_db_folder + "Lecturers.csv"
 
@@ -73,14 +100,10 @@ def migrateLecturers(cursor):
     VALUES (%s, %s, %s, %s, %s);
     '''
 
-    for index, row in df.iterrows():
-        values = (row['Id'], row['NameAbbr'],
-                  row['Name'], row['Office'], row['Hide'])
-        cursor.execute(insert_query, values)
-        connection.commit()
+    bulkInsert(connection, 'LECTURER', insert_query, df, ['Id', 'NameAbbr', 'Name', 'Office', 'Hide'])
 
 
-def migrateRestrictions(cursor):
+def migrateRestrictions(connection):
     input_file = old_db_folder + "Restricoes.csv"
     output_file = new_db_folder + "Restrictions.csv"
 
@@ -98,14 +121,11 @@ def migrateRestrictions(cursor):
     VALUES (%s, %s, %s, %s, %s, %s);
     '''
 
-    for index, row in df.iterrows():
-        values = (row['Id'], row['LecturerId'], row['Type'],
-                  row['Weekday'], row['StartTime'], row['EndTime'])
-        cursor.execute(insert_query, values)
-        connection.commit()
+    bulkInsert(connection, 'RESTRICTION', insert_query, df,
+               ['Id', 'LecturerId', 'Type', 'Weekday', 'StartTime', 'EndTime'])
 
 
-def migrateEvents(cursor):
+def migrateEvents(connection):
     input_file = old_db_folder + "Cadeiras.csv"
     output_file = new_db_folder + "Events.csv"
 
@@ -128,14 +148,11 @@ def migrateEvents(cursor):
     VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s);
     '''
 
-    for index, row in df.iterrows():
-        values = (row['Id'], row['Subject'], row['SubjectAbbr'], row['LecturerId'], row['RoomId'],
-                  row['StartTime'], row['EndTime'], row['WeekDay'], row['Hide'])
-        cursor.execute(insert_query, values)
-        connection.commit()
+    bulkInsert(connection, 'EVENT', insert_query, df, ['Id', 'Subject', 'SubjectAbbr', 'LecturerId', 'RoomId',
+                                                   'StartTime', 'EndTime', 'WeekDay', 'Hide'])
 
 
-def migrateBlocks(cursor):
+def migrateBlocks(connection):
     input_file = old_db_folder + "Blocos.csv"
     output_file = new_db_folder + "Blocks.csv"
 
@@ -152,13 +169,10 @@ def migrateBlocks(cursor):
     VALUES (%s, %s, %s, %s);
     '''
 
-    for index, row in df.iterrows():
-        values = (row['Id'], row['NameAbbr'], row['Name'], row['Hide'])
-        cursor.execute(insert_query, values)
-        connection.commit()
+    bulkInsert(connection, 'BLOCK', insert_query, df, ['Id', 'NameAbbr', 'Name', 'Hide'])
 
 
-def migrateBlockToEvent(cursor):
+def migrateBlockToEvent(connection):
     input_file = old_db_folder + "Cadeiras por Bloco.csv"
     output_file = new_db_folder + "BlockToEvent.csv"
 
@@ -174,44 +188,89 @@ def migrateBlockToEvent(cursor):
     VALUES (%s, %s);
     '''
 
-    for index, row in df.iterrows():
-        values = (int(row['BlockId']), int(row['EventId']))
-        cursor.execute(insert_query, values)
-        connection.commit()
+    df = df.astype({'BlockId': int, 'EventId': int})
+    bulkInsert(connection, 'BLOCK_TO_EVENT', insert_query, df, ['BlockId', 'EventId'])
+
+
+MIGRATIONS = {
+    'ROOM': migrateRooms,
+    'LECTURER': migrateLecturers,
+    'RESTRICTION': migrateRestrictions,
+    'EVENT': migrateEvents,
+    'BLOCK': migrateBlocks,
+    'BLOCK_TO_EVENT': migrateBlockToEvent,
+}
+
 
-exit_code = 0
-try:
-    migrateRooms(cursor)
-except Exception as e:
-    traceback.print_exc()
-    exit_code = 1
-try:    
-    migrateLecturers(cursor)
-except Exception as e:
-    traceback.print_exc()
-    exit_code = 1
-try:    
-    migrateRestrictions(cursor)
-except Exception as e:
-    traceback.print_exc()
-    exit_code = 1
-try:    
-    migrateEvents(cursor)
-except Exception as e:
-    traceback.print_exc()
-    exit_code = 1
-try:    
-    migrateBlocks(cursor)
-except Exception as e:
-    traceback.print_exc()
-    exit_code = 1
-try:    
-    migrateBlockToEvent(cursor)
-except Exception as e:
-    traceback.print_exc()
-    exit_code = 1
-
-# Close the connection
-cursor.close()
-connection.close()
-sys.exit(exit_code)
\ No newline at end of file
+def readDependencies(schema_file):
+    """
+    Returns {table: set of tables it references} for the tables in MIGRATIONS, read from the FOREIGN KEY statements of the schema.
+    """
+    dependencies = {table: set() for table in MIGRATIONS}
+    with open(schema_file) as file:
+        schema = file.read()
+    for table, parent in re.findall(r"ALTER TABLE `(\w+)` ADD FOREIGN KEY \(`\w+`\) REFERENCES `(\w+)`", schema):
+        if table in MIGRATIONS and parent in MIGRATIONS and parent != table:
+            dependencies[table].add(parent)
+    return dependencies
+
+
+def runMigrations(dependencies, workers):
+    """
+    Migrates every table once the tables it references are loaded, running up to workers tables at a time, each with its own connection. A table whose migration fails is reported and the tables depending on it are skipped. Returns the set of tables that were not migrated.
+    """
+    local = threading.local()
+    connections = []
+    connections_lock = threading.Lock()
+
+    def migrate(table):
+        if not hasattr(local, 'connection'):
+            local.connection = mysql.connector.connect(**db_config)
+            with connections_lock:
+                connections.append(local.connection)
+        MIGRATIONS[table](local.connection)
+
+    done, failed, running = set(), set(), {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while len(done) + len(failed) < len(dependencies):
+                changed = False
+                for table, parents in dependencies.items():
+                    if table in done or table in failed or table in running.values():
+                        continue
+                    if parents & failed:
+                        print(f"{table}: skipped, depends on {', '.join(sorted(parents & failed))}")
+                        failed.add(table)
+                        changed = True
+                    elif parents <= done:
+                        running[executor.submit(migrate, table)] = table
+                        changed = True
+                if not running:
+                    if changed:
+                        continue
+                    raise Exception(f"Circular foreign keys between {', '.join(sorted(set(dependencies) - done - failed))}")
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    table = running.pop(future)
+                    try:
+                        future.result()
+                        done.add(table)
+                    except Exception:
+                        print(f"{table}: failed")
+                        traceback.print_exc()
+                        failed.add(table)
+    finally:
+        for connection in connections:
+            connection.close()
+    return failed
+
+
+def main():
+    start = time.perf_counter()
+    failed = runMigrations(readDependencies(schema_file), workers)
+    print(f"Migration finished in {time.perf_counter() - start:.2f}s")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
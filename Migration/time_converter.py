@@ -1,34 +1,38 @@
 import pandas as pd
-import datetime
+import numpy as np
 
+# "HH:MM:00" of every minute of the day
+CLOCK = np.array([f'{minute // 60:02}:{minute % 60:02}:00' for minute in range(24 * 60)], dtype=object)
 
-def datetime_to_timedelta(dt: datetime.datetime):
-    if dt is not pd.NaT:
-        return datetime.timedelta(hours=dt.hour, minutes=dt.minute, seconds=dt.second)
-    else:
-        return pd.NaT    
+
+def time_of_day(column: pd.Series):
+    """
+    Parses a column of dates and returns the seconds since midnight of each, NaN where it is missing.
+    """
+    dt = pd.to_datetime(column).dt
+    return dt.hour * 3600 + dt.minute * 60 + dt.second
+
+
+def seconds_to_string(seconds: pd.Series):
+    """
+    Formats seconds as "HH:MM:00", wrapping around past midnight. Missing values become NaT.
+    """
+    missing = seconds.isna().to_numpy()
+    minutes = seconds.fillna(0).to_numpy(dtype=np.int64) // 60 % (24 * 60)
+    strings = CLOCK[minutes]
+    strings[missing] = pd.NaT
+    return pd.Series(strings, index=seconds.index)
 
 """
 converts the "hora" and "duração" columns to "StartTime" and "Endtime columns"
 """
-def convertTime(df: pd.DataFrame): 
-    # Convert the "hora" and "duracao" columns to datetime objects
-    df["hora"] = pd.to_datetime(df["hora"])
-    df["hora"] = df["hora"].apply(lambda dt: datetime_to_timedelta(dt))
-    df["duracao"] = pd.to_datetime(df["duracao"])
-    df["duracao"] = df["duracao"].apply(lambda dt: datetime_to_timedelta(dt))
+def convertTime(df: pd.DataFrame):
+    start = time_of_day(df["hora"])
+    duration = time_of_day(df["duracao"])
 
-    # Calculate the "EndTime" by adding "hora" and "duracao" columns
-    df["EndTime"] = df["hora"] + df["duracao"]
+    # The "EndTime" is the "hora" plus the "duracao"
     df = df.drop(columns=["duracao"])
-
-    def timedelta_to_string(td : datetime.timedelta):
-        if td is not pd.NaT:
-            return f'{td.seconds//3600:02}:{(td.seconds//60)%60:02}:00'
-        else:
-            return pd.NaT 
     df.rename(columns={"hora": "StartTime"}, inplace=True)
-
-    df["StartTime"] = df["StartTime"].apply(lambda td: timedelta_to_string(td))
-    df["EndTime"] = df["EndTime"].apply(lambda td: timedelta_to_string(td))
-    return df
\ No newline at end of file
+    df["StartTime"] = seconds_to_string(start)
+    df["EndTime"] = seconds_to_string(start + duration)
+    return df